@@ -1,13 +1,14 @@
 import argparse
 import base64
 import binascii
+import multiprocessing
 import signal
 import sys
 import time
 from pathlib import Path
 
 import src.utils as utils
-from src.auth_process import AuthProcess
+from src.match_methods import MATCH_METHODS
 from src.utils import json_parse
 from src.version import PROGRAM_VERSION
 
@@ -94,8 +95,8 @@ class ChineseArgumentParser(argparse.ArgumentParser):
         self.exit(2, f"{self.prog}: 错误: {translate(message)}\n")
 
 
-def json_print(binary):
-    print(utils.json_stringify(binary, indent=2))
+def json_print(binary, out=print):
+    out(utils.json_stringify(binary, indent=2))
 
 
 def print_program_info():
@@ -136,9 +137,20 @@ parser.add_argument(
     "-m", "--method",
     type=str,
     default='template',
-    choices=['template', 'brute', 'speed'],
+    choices=list(MATCH_METHODS),
     help="匹配背景块与需选块的方法（命令为 check_in 且开启 自动签到模式 时生效，默认为 template）"
 )
+parser.add_argument(
+    "-w", "--workers",
+    type=int,
+    default=0,
+    help="验证码识别使用的进程数，大于 1 时使用进程池并行匹配（命令为 check_in 且开启 自动签到模式 或命令为 web 时生效，默认为 0 不开启）"
+)
+parser.add_argument(
+    "-t", "--timings",
+    action="store_true",
+    help="输出自动签到各阶段耗时（命令为 check_in 且开启 自动签到模式 时生效，默认关闭）"
+)
 parser.add_argument(
     "-c", "--config",
     type=str,
@@ -146,98 +158,135 @@ parser.add_argument(
     help="设置 config 文件路径，默认为程序同目录 config.json"
 )
 
-args = parser.parse_args()
 
-print_program_info()
+def run(args):
+    print_program_info()
 
-command = args.command
+    command = args.command
 
-config_path = (Path(utils.get_program_base_path()) / 'config.json').resolve()
+    config_path = (Path(utils.get_program_base_path()) / 'config.json').resolve()
 
-if args.config:
-    config_path = Path(args.config).resolve()
+    if args.config:
+        config_path = Path(args.config).resolve()
 
-if command == 'check_in':
-    from src.main import MainLogic, check_in, get_check_in_status
+    if command == 'check_in':
+        from src.auth_process import AuthProcess
+        from src.main import MainLogic, check_in, get_check_in_status, load_captcha_dependencies
+        from src.orchestrator import map_ordered
 
-    main = MainLogic(config_path)
+        main = MainLogic(config_path)
 
-    auto = args.auto
-    print(f"执行{'自动' if auto else '手动'}签到")
+        auto = args.auto
+        print(f"执行{'自动' if auto else '手动'}签到")
+        if auto:
+            # 自动签到需要识别验证码，在并发处理账号之前提前导入
+            load_captcha_dependencies()
 
-    auth_process = AuthProcess(main.config, main.common_headers)
+        auth_process = AuthProcess(main.config, main.common_headers, main.http)
 
-    for auth_info in auth_process.enumerate():
-        name = auth_info.name
-        if auth_process.multi:
-            print(f"=== 执行 {name} ===")
+        def process(auth_info, out=print):
+            name = auth_info.name
+            if auth_process.multi:
+                out(f"=== 执行 {name} ===")
 
-        if auth_info.error:
-            print("错误")
-            json_print(auth_info.error)
-        else:
-            if args.force:
-                print('跳过签到状态检测')
+            if auth_info.error:
+                out("错误")
+                json_print(auth_info.error, out)
             else:
-                print('进行签到状态检测...')
-                status = get_check_in_status(auth_info)
-                if 'check_in' in status:
-                    if status.get('check_in'):
-                        print('已签到')
-                        if auth_process.multi:
-                            print()
-                        continue
+                if args.force:
+                    out('跳过签到状态检测')
+                else:
+                    out('进行签到状态检测...')
+                    status = get_check_in_status(auth_info)
+                    if 'check_in' in status:
+                        if status.get('check_in'):
+                            out('已签到')
+                            if auth_process.multi:
+                                out('')
+                            return
+                        else:
+                            out('未签到')
                     else:
-                        print('未签到')
+                        out('签到状态检测失败')
+                        json_print(status, out)
+                if auto:
+                    out('请等待执行自动签到')
+                    start_time = time.time()
+                    result = main.auto_check_in(auth_info, True, args.method, args.workers, args.timings)
+                    end_time = time.time()
+                    execution_time = end_time - start_time
+                    out(f"自动签到执行耗时: {execution_time:.4f} 秒")
+                    timings = result.pop('timings', None) if isinstance(result, dict) else None
+                    if timings:
+                        out('各阶段耗时（并行的阶段会重叠）:')
+                        for stage, duration in timings['stages'].items():
+                            out(f"  {stage}: {duration:.2f} 毫秒")
                 else:
-                    print('签到状态检测失败')
-                    json_print(status)
-            if auto:
-                print('请等待执行自动签到')
-                start_time = time.time()
-                result = main.auto_check_in(auth_info, True, args.method)
-                end_time = time.time()
-                execution_time = end_time - start_time
-                print(f"自动签到执行耗时: {execution_time:.4f} 秒")
-            else:
-                captcha = None
-                while True:
-                    try:
-                        text = f"请打开 {Path(base_path) / 'static' / 'captcha.html'} 完成验证码，并输入显示的 Base64 验证码: " if captcha is None else "验证码错误，请重新输入: "
-                        captcha = json_parse(base64.b64decode(input(text)), else_none=True) or {}
-                        if captcha.get('randstr') or captcha.get('ticket'):
-                            break
-                    except binascii.Error:
-                        pass
-                    captcha = ''
-                result = check_in(captcha, auth_info)
-            print('签到结果: ' + ('签到成功' if result.get('code') == 200 else ''))
-            json_print(result)
-
-        if auth_process.multi:
-            print()
-elif command == 'web':
-    import src.web as web
-
-    web.config_path = config_path
-
-    web.run_main(host='localhost', port=args.port)
-elif command == 'status':
-    from src.main import MainLogic, get_check_in_status
-
-    main = MainLogic(config_path)
-
-    auth_process = AuthProcess(main.config, main.common_headers)
-
-    print('检测签到状态...')
-    for auth_info in auth_process.enumerate():
-        name = f"{auth_info.name}: " if auth_process.multi else ''
-        status = get_check_in_status(auth_info)
-        if 'check_in' in status:
-            if status.get('check_in'):
-                print(f"{name}已签到")
-            else:
-                print(f"{name}未签到")
+                    captcha = None
+                    while True:
+                        try:
+                            text = f"请打开 {Path(base_path) / 'static' / 'captcha.html'} 完成验证码，并输入显示的 Base64 验证码: " if captcha is None else "验证码错误，请重新输入: "
+                            captcha = json_parse(base64.b64decode(input(text)), else_none=True) or {}
+                            if captcha.get('randstr') or captcha.get('ticket'):
+                                break
+                        except binascii.Error:
+                            pass
+                        captcha = ''
+                    result = check_in(captcha, auth_info)
+                out('签到结果: ' + ('签到成功' if result.get('code') == 200 else ''))
+                json_print(result, out)
+
+            if auth_process.multi:
+                out('')
+
+        if auto:
+            def buffered_process(auth_info):
+                # 并发执行时先缓存每个账号的输出，按账号顺序打印，避免输出交错
+                lines = []
+                process(auth_info, lines.append)
+                return lines
+
+            for lines in map_ordered(buffered_process, auth_process.enumerate(main.concurrency), main.concurrency):
+                for line in lines:
+                    print(line)
         else:
-            print(f"{name}签到状态检测失败")
-            json_print(status)
+            # 手动签到需要逐个输入验证码
+            for auth_info in auth_process.enumerate():
+                process(auth_info)
+    elif command == 'web':
+        import src.web as web
+
+        web.config_path = config_path
+        web.icr_workers = args.workers
+
+        web.run_main(host='localhost', port=args.port)
+    elif command == 'status':
+        from src.auth_process import AuthProcess
+        from src.main import MainLogic, get_check_in_status
+        from src.orchestrator import map_ordered
+
+        main = MainLogic(config_path)
+
+        auth_process = AuthProcess(main.config, main.common_headers, main.http)
+
+        print('检测签到状态...')
+
+        def process(auth_info):
+            return auth_info, get_check_in_status(auth_info)
+
+        for auth_info, status in map_ordered(process, auth_process.enumerate(main.concurrency), main.concurrency):
+            name = f"{auth_info.name}: " if auth_process.multi else ''
+            if 'check_in' in status:
+                if status.get('check_in'):
+                    print(f"{name}已签到")
+                else:
+                    print(f"{name}未签到")
+            else:
+                print(f"{name}签到状态检测失败")
+                json_print(status)
+
+
+if __name__ == '__main__':
+    # 多进程识别在 Windows 和打包后的程序中需要
+    multiprocessing.freeze_support()
+    run(parser.parse_args())
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from src.ICR import main as icr_main, convert_matches_to_positions, MATCH_METHODS
+from src.image_cache import image_cache
+from src.timing import Timings
+from src.utils import load_saved_captchas
+
+# 与参考方法的位置距离在此范围内（像素）视为一致
+AGREEMENT_TOLERANCE = 5.0
+# 与基准相比中位耗时增加、吞吐量下降超过此比例视为变慢
+DEFAULT_THRESHOLD = 0.1
+# 默认测试的方法，brute 耗时过长不默认测试
+DEFAULT_METHODS = [method for method in MATCH_METHODS if method != 'brute']
+
+
+def summarize(values):
+    """耗时统计（毫秒）"""
+    if not values:
+        return {}
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        'mean': round(float(values.mean()), 3),
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p90': round(float(np.percentile(values, 90)), 3),
+        'p99': round(float(np.percentile(values, 99)), 3),
+        'max': round(float(values.max()), 3)
+    }
+
+
+def run_method(corpus, method, repeat=1, workers=None, warm=False):
+    """
+    使用一种方法识别所有验证码
+
+    参数:
+        warm: 是否保留识别缓存，默认每次识别前清空，测量完整的解码和预处理耗时
+
+    返回:
+        (统计结果, {名称: 位置列表})
+    """
+    totals = []
+    stages = {}
+    evaluations = []
+    positions = {}
+
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for name, bg_img, sprite_img in corpus:
+            if not warm:
+                image_cache.clear()
+
+            timings = Timings()
+            stats = {}
+            case_start = time.perf_counter()
+            matches = icr_main(bg_img, sprite_img, method, stats=stats, workers=workers, timings=timings)
+            totals.append((time.perf_counter() - case_start) * 1000)
+
+            for stage, duration in timings.totals().items():
+                stages.setdefault(stage, []).append(duration)
+            evaluations.append(stats.get('evaluations', 0))
+            positions.setdefault(name, convert_matches_to_positions(matches))
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        'runs': len(totals),
+        'total': summarize(totals),
+        'stages': {stage: summarize(values) for stage, values in stages.items()},
+        'throughput': round(len(totals) / elapsed, 3) if elapsed else None,
+        'evaluations': round(sum(evaluations) / len(evaluations), 1) if evaluations else 0
+    }, positions
+
+
+def measure_peak_memory(corpus, method, workers=None):
+    """
+    识别单个验证码时的最大内存分配（字节）
+
+    使用 tracemalloc 统计，包含 numpy 数组，不包含 OpenCV 内部的临时缓冲区
+    """
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _, bg_img, sprite_img in corpus:
+            image_cache.clear()
+            tracemalloc.reset_peak()
+            icr_main(bg_img, sprite_img, method, workers=workers)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def positions_close(positions, reference, tolerance=AGREEMENT_TOLERANCE):
+    if len(positions) != len(reference):
+        return False
+    return all(
+        ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5 <= tolerance
+        for (x1, y1), (x2, y2) in zip(positions, reference)
+    )
+
+
+def agreement(positions, reference_positions, tolerance=AGREEMENT_TOLERANCE):
+    """与参考方法结果一致的验证码数量，以及不一致的验证码名称"""
+    exact = 0
+    close = 0
+    different = []
+    for name, reference in reference_positions.items():
+        current = positions.get(name)
+        if current == reference:
+            exact += 1
+        if current is not None and positions_close(current, reference, tolerance):
+            close += 1
+        else:
+            different.append(name)
+    return {
+        'cases': len(reference_positions),
+        'exact': exact,
+        'within_tolerance': close,
+        'tolerance': tolerance,
+        'different': different
+    }
+
+
+def compare_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    与基准结果比较，返回变慢或一致率下降的说明列表
+    """
+    regressions = []
+    for method, result in results['methods'].items():
+        base = baseline.get('methods', {}).get(method)
+        if not base:
+            continue
+
+        current_p50 = result['total'].get('p50')
+        base_p50 = base.get('total', {}).get('p50')
+        if current_p50 and base_p50 and current_p50 > base_p50 * (1 + threshold):
+            regressions.append(f"{method}: 中位耗时 {base_p50:.1f} ms -> {current_p50:.1f} ms")
+
+        current_throughput = result.get('throughput')
+        base_throughput = base.get('throughput')
+        if current_throughput and base_throughput and current_throughput < base_throughput * (1 - threshold):
+            regressions.append(f"{method}: 吞吐量 {base_throughput:.2f}/s -> {current_throughput:.2f}/s")
+
+        current_agreement = result.get('agreement')
+        base_agreement = base.get('agreement')
+        if current_agreement and base_agreement and \
+                current_agreement['cases'] == base_agreement['cases'] and \
+                current_agreement['within_tolerance'] < base_agreement['within_tolerance']:
+            regressions.append(
+                f"{method}: 与 {results['reference']} 结果一致 "
+                f"{base_agreement['within_tolerance']} -> {current_agreement['within_tolerance']}"
+            )
+
+    return regressions
+
+
+def print_results(results):
+    print(f"\n{'方法':<12}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'吞吐量(/s)':>12}"
+          f"{'峰值内存(MB)':>14}{'一致':>10}")
+    for method, result in results['methods'].items():
+        total = result['total']
+        peak = result.get('peak_memory')
+        agree = result.get('agreement')
+        peak_text = f"{peak / 1024 / 1024:.1f}" if peak is not None else '-'
+        agree_text = f"{agree['within_tolerance']}/{agree['cases']}" if agree else '-'
+        print(
+            f"{method:<12}{total.get('p50', 0):>10.1f}{total.get('p90', 0):>10.1f}{total.get('p99', 0):>10.1f}"
+            f"{result['throughput'] or 0:>12.2f}{peak_text:>14}{agree_text:>10}"
+        )
+        stages = ', '.join(f"{stage} {values['p50']:.1f}" for stage, values in result['stages'].items())
+        print(f"{'':<12}各阶段 p50(ms): {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线验证码识别性能测试')
+    parser.add_argument('corpus', type=str, help='验证码目录，每个子目录包含 bg.jpg 和 sprite.jpg（如 fails）')
+    parser.add_argument('--methods', type=str, nargs='+', default=DEFAULT_METHODS, choices=MATCH_METHODS,
+                        help=f"测试的匹配方法，默认为 {' '.join(DEFAULT_METHODS)}")
+    parser.add_argument('--reference', type=str, default='template', choices=MATCH_METHODS,
+                        help='比较位置一致性的参考方法，默认为 template')
+    parser.add_argument('--repeat', type=int, default=1, help='每个验证码重复识别的次数，默认为 1')
+    parser.add_argument('--workers', type=int, default=None, help='验证码识别使用的进程数')
+    parser.add_argument('--warm', action='store_true', help='保留识别缓存（默认每次识别前清空）')
+    parser.add_argument('--no-memory', action='store_true', help='不统计峰值内存')
+    parser.add_argument('--output', type=str, default=None, help='保存结果的 JSON 文件')
+    parser.add_argument('--baseline', type=str, default=None, help='与该 JSON 文件中的基准结果比较')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'耗时增加超过该比例视为变慢，默认为 {DEFAULT_THRESHOLD}')
+    args = parser.parse_args()
+
+    corpus = load_saved_captchas(args.corpus)
+    if not corpus:
+        print(f"{args.corpus} 中没有找到验证码（每个子目录需包含 bg.jpg 和 sprite.jpg）")
+        sys.exit(1)
+    print(f"共 {len(corpus)} 个验证码")
+
+    methods = list(dict.fromkeys(args.methods))
+    if args.reference not in methods:
+        methods.insert(0, args.reference)
+
+    # 预热：加载进程池、缓存旋转矩阵等，不计入结果
+    for method in methods:
+        icr_main(corpus[0][1], corpus[0][2], method, workers=args.workers)
+
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'corpus': os.path.abspath(args.corpus),
+        'cases': len(corpus),
+        'repeat': args.repeat,
+        'workers': args.workers,
+        'warm': args.warm,
+        'reference': args.reference,
+        'environment': {
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'methods': {}
+    }
+
+    all_positions = {}
+    for method in methods:
+        print(f"测试 {method} ...")
+        result, all_positions[method] = run_method(corpus, method, args.repeat, args.workers, args.warm)
+        if not args.no_memory:
+            result['peak_memory'] = measure_peak_memory(corpus, method, args.workers)
+        results['methods'][method] = result
+
+    for method in methods:
+        results['methods'][method]['agreement'] = agreement(all_positions[method], all_positions[args.reference])
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_baseline(results, baseline, args.threshold)
+        if regressions:
+            print("\n与基准相比:")
+            for regression in regressions:
+                print(f"  × {regression}")
+            sys.exit(1)
+        print("\n与基准相比没有变慢")
+
+
+if __name__ == "__main__":
+    main()
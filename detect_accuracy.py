@@ -12,10 +12,13 @@ import cv2
 import numpy as np
 from queue import Queue
 
-from src.main import MainLogic
-from src.ICR import main as icr_main, convert_matches_to_positions, find_part_positions
+from src.main import MainLogic, load_captcha_dependencies
+from src.ICR import main as icr_main, convert_matches_to_positions, find_part_positions, MATCH_METHODS
+from src.utils import load_saved_captchas
 
 main_logic = MainLogic(None, {}, True)
+# 提前导入识别依赖，测试在后台线程中执行
+load_captcha_dependencies()
 
 
 def bytes_to_cv_image(img_bytes):
@@ -125,7 +128,7 @@ class CaptchaTesterGUI:
         method_combobox = ttk.Combobox(
             row1_frame,
             textvariable=self.method_var,
-            values=["template", "brute", "speed"],
+            values=list(MATCH_METHODS),
             state="readonly",
             width=10
         )
@@ -500,9 +503,11 @@ def main():
     root.mainloop()
 
 
-def auto_test(test_count, method):
-    correct_count = 0
+def auto_test(test_count, method, compare_method=None):
     """运行测试"""
+    correct_count = 0
+    agree_count = 0
+    evaluations = []
     for i in range(1, test_count + 1):
         print(f"\n=== 测试 {i}/{test_count} ===")
 
@@ -522,8 +527,19 @@ def auto_test(test_count, method):
         # 识别验证码
         try:
             # 直接传入二进制数据
-            positions = find_part_positions(bg_img, sprite_img, method)
-            print("识别结果:", positions)
+            stats = {}
+            positions = convert_matches_to_positions(icr_main(bg_img, sprite_img, method, stats=stats))
+            evaluations.append(stats.get('evaluations', 0))
+            print("识别结果:", positions, f"（模板匹配 {stats.get('evaluations', 0)} 次）")
+
+            # 与对照方法比较识别结果
+            if compare_method:
+                compare_positions = find_part_positions(bg_img, sprite_img, compare_method)
+                if compare_positions == positions:
+                    agree_count += 1
+                    print(f"与 {compare_method} 结果一致")
+                else:
+                    print(f"与 {compare_method} 结果不一致:", compare_positions)
 
             is_correct = False
 
@@ -571,17 +587,60 @@ def auto_test(test_count, method):
     # 计算并显示准确率
     accuracy = (correct_count / test_count) * 100
     print(f"\n测试完成，正确率: {accuracy:.2f}% ({correct_count}/{test_count})")
+    if evaluations:
+        print(f"平均模板匹配次数: {sum(evaluations) / len(evaluations):.1f}")
+    if compare_method:
+        print(f"与 {compare_method} 结果一致: {agree_count}/{test_count}")
+
+
+def replay_test(folder, method, compare_method=None):
+    """离线重放保存的验证码（如 fails 目录中的失败案例），统计识别耗时及与对照方法结果一致的比例"""
+    cases = load_saved_captchas(folder)
+    if not cases:
+        print(f"{folder} 中没有找到验证码（每个子目录需包含 bg.jpg 和 sprite.jpg）")
+        return
+
+    agree_count = 0
+    total_time = 0
+    evaluations = []
+    for i, (name, bg_img, sprite_img) in enumerate(cases, 1):
+        stats = {}
+        start_time = time.perf_counter()
+        positions = convert_matches_to_positions(icr_main(bg_img, sprite_img, method, stats=stats))
+        total_time += time.perf_counter() - start_time
+        evaluations.append(stats.get('evaluations', 0))
+
+        message = f"[{i}/{len(cases)}] {name}: {positions}"
+        if compare_method:
+            compare_positions = find_part_positions(bg_img, sprite_img, compare_method)
+            if compare_positions == positions:
+                agree_count += 1
+            else:
+                message += f"，与 {compare_method} 结果不一致: {compare_positions}"
+        print(message)
+
+    print(f"\n重放完成，共 {len(cases)} 个验证码，平均识别耗时: {total_time / len(cases) * 1000:.1f} ms")
+    print(f"平均模板匹配次数: {sum(evaluations) / len(evaluations):.1f}")
+    if compare_method:
+        print(f"与 {compare_method} 结果一致: {agree_count}/{len(cases)}")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='验证码识别准确率测试')
     parser.add_argument('--count', type=int, default=100, help='测试次数，默认为100')
     parser.add_argument('--auto', action='store_true', help='自动模式（会出现请求过于频繁）')
-    parser.add_argument('--method', type=str, default='template', help='匹配方法，默认为 template')
+    parser.add_argument('--method', type=str, default='template', choices=MATCH_METHODS,
+                        help='匹配方法，默认为 template')
+    parser.add_argument('--compare', type=str, default=None, choices=MATCH_METHODS,
+                        help='自动模式下同时使用该方法识别，统计两种方法结果一致的比例')
+    parser.add_argument('--replay', type=str, default=None, metavar='DIR',
+                        help='离线重放目录中保存的验证码（如 fails），不请求验证码接口')
 
     args = parser.parse_args()
 
-    if args.auto:
-        auto_test(args.count, args.method)
+    if args.replay:
+        replay_test(args.replay, args.method, args.compare)
+    elif args.auto:
+        auto_test(args.count, args.method, args.compare)
     else:
         main()
@@ -0,0 +1,531 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from benchmark import summarize
+from src.ICR import MATCH_METHODS
+
+# 模拟验证码的背景图片和需选图片尺寸
+BG_SIZE = (672, 480)
+SPRITE_HEIGHT = 60
+# 每张验证码的图标数量
+ICON_COUNT = 3
+ICON_SIZE = 62
+# 校验时答案与图标中心的距离在此范围内（像素）视为正确
+ANSWER_TOLERANCE = 30
+
+# 模拟的 TDC 脚本，只提供程序用到的 setData、getData、getInfo
+STUB_TDC_SCRIPT = '''
+window.TDC = {
+    setData: function (data) {
+    },
+    getData: function () {
+        return "load-test-collect";
+    },
+    getInfo: function () {
+        return {info: "load-test-eks"};
+    }
+};
+'''
+
+# 压力测试可执行的操作：(网页接口路径, 判断结果是否成功的函数)
+OPERATIONS = {
+    'auto_check_in': ('/auto_check_in', lambda result: result.get('code') == 200),
+    'complete_captcha': ('/complete_captcha', lambda result: bool(result.get('ticket'))),
+    'status': ('/is_check_in', lambda result: 'check_in' in result)
+}
+
+
+def draw_icon(kind, size):
+    """绘制一个白色图标的掩码"""
+    icon = np.zeros((size, size), np.uint8)
+    center = size // 2
+    if kind == 0:
+        cv2.fillPoly(icon, [np.array([[center, 2], [size - 3, size - 3], [2, size - 3]])], 255)
+    elif kind == 1:
+        cv2.rectangle(icon, (3, 8), (size - 4, size - 9), 255, -1)
+        cv2.circle(icon, (center, 8), 6, 255, -1)
+    elif kind == 2:
+        angles = np.linspace(0, 2 * np.pi, 11)[:-1]
+        radius = np.where(np.arange(10) % 2 == 0, center - 2, center / 2.2)
+        points = np.stack([center + radius * np.sin(angles), center - radius * np.cos(angles)], 1)
+        cv2.fillPoly(icon, [points.astype(np.int32)], 255)
+    elif kind == 3:
+        cv2.ellipse(icon, (center, center), (center - 2, center // 2), 0, 0, 360, 255, -1)
+        cv2.rectangle(icon, (center - 3, 2), (center + 3, size - 2), 255, -1)
+    else:
+        cv2.rectangle(icon, (2, 2), (size // 2, size - 3), 255, -1)
+        cv2.rectangle(icon, (2, size - 10), (size - 3, size - 3), 255, -1)
+    return icon
+
+
+def make_captcha(rng):
+    """
+    生成一张模拟验证码：背景中有旋转过的黑色图标，需选图片中按顺序排列相同的图标
+
+    返回:
+        (背景图片 JPEG, 需选图片 JPEG, 每个图标在背景中的中心点坐标)
+    """
+    width, height = BG_SIZE
+    bg = cv2.GaussianBlur(rng.integers(90, 230, (height, width, 3)).astype(np.uint8), (31, 31), 0)
+    kinds = rng.choice(5, ICON_COUNT, replace=False)
+    padded = ICON_SIZE + 30
+
+    positions = []
+    for kind in kinds:
+        canvas = np.zeros((padded, padded), np.uint8)
+        canvas[15:15 + ICON_SIZE, 15:15 + ICON_SIZE] = draw_icon(kind, ICON_SIZE)
+        matrix = cv2.getRotationMatrix2D((padded / 2, padded / 2), float(rng.integers(-40, 41)), 1.0)
+        rotated = cv2.warpAffine(canvas, matrix, (padded, padded))
+        while True:
+            x = int(rng.integers(10, width - padded - 10))
+            y = int(rng.integers(10, height - padded - 10))
+            if all(abs(x + padded / 2 - px) > 100 or abs(y + padded / 2 - py) > 100 for px, py in positions):
+                break
+        bg[y:y + padded, x:x + padded][rotated > 127] = 10
+        positions.append((x + padded / 2, y + padded / 2))
+
+    sprite = np.full((SPRITE_HEIGHT, 8 + ICON_COUNT * 52, 3), 255, np.uint8)
+    for i, kind in enumerate(kinds):
+        icon = cv2.resize(draw_icon(kind, ICON_SIZE), (40, 40), interpolation=cv2.INTER_AREA)
+        sprite[10:50, 8 + i * 52:48 + i * 52][icon > 127] = 0
+
+    return cv2.imencode('.jpg', bg)[1].tobytes(), cv2.imencode('.jpg', sprite)[1].tobytes(), positions
+
+
+class StubState:
+    """
+    模拟服务器的状态：预先生成的验证码、每个会话当前的验证码和 PoW 答案，以及请求统计
+
+    参数:
+        latency: 每个请求的平均延迟（秒）
+        jitter: 延迟的随机浮动比例，实际延迟在 latency * (1 ± jitter) 之间
+        failure_rate: 请求直接返回 503 的比例
+        verify_failure_rate: 答案正确时仍然校验失败的比例
+        captchas: 预先生成的验证码数量，刷新验证码时可能得到相同的图片
+        pow_max: PoW 答案的上限，越大计算越慢
+    """
+
+    def __init__(self, latency=0.05, jitter=0.2, failure_rate=0.0, verify_failure_rate=0.0, captchas=8,
+                 pow_max=20000, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.verify_failure_rate = verify_failure_rate
+        self.pow_max = pow_max
+        self.random = random.Random(seed)
+
+        rng = np.random.default_rng(seed)
+        self.captchas = [make_captcha(rng) for _ in range(max(1, captchas))]
+
+        # sess -> {'captcha': 验证码序号, 'pow_answer': PoW 答案}
+        self.sessions = {}
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def delay(self):
+        if self.latency > 0:
+            with self._lock:
+                factor = self.random.uniform(1 - self.jitter, 1 + self.jitter)
+            time.sleep(self.latency * factor)
+
+    def should_fail(self, rate):
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self.random.random() < rate
+
+    def random_captcha(self):
+        with self._lock:
+            return self.random.randrange(len(self.captchas))
+
+    def new_session(self):
+        """创建会话，分配一张验证码和 PoW 题目，返回 (sess, 验证码序号, PoW 配置)"""
+        with self._lock:
+            number = self.random.randrange(self.pow_max)
+        sess = secrets.token_hex(16)
+        prefix = secrets.token_hex(8)
+        index = self.random_captcha()
+        with self._lock:
+            self.sessions[sess] = {'captcha': index, 'pow_answer': f"{prefix}{number}"}
+        pow_cfg = {'prefix': prefix, 'md5': hashlib.md5(f"{prefix}{number}".encode('utf-8')).hexdigest()}
+        return sess, index, pow_cfg
+
+    def refresh_session(self, sess):
+        """刷新会话的验证码（可能与之前相同），PoW 题目不变，会话不存在时返回 None"""
+        index = self.random_captcha()
+        with self._lock:
+            session = self.sessions.get(sess)
+            if session is None:
+                return None
+            session['captcha'] = index
+        return index
+
+    def dyn_show_info(self, index):
+        return {
+            'bg_elem_cfg': {'img_url': f"/img/bg/{index}.jpg"},
+            'sprite_url': f"/img/sprite/{index}.jpg"
+        }
+
+    def check_answer(self, sess, form):
+        """校验答案和 PoW，成功后会话失效"""
+        with self._lock:
+            session = self.sessions.get(sess)
+        if session is None:
+            return False
+
+        try:
+            answers = json.loads(form.get('ans', '[]'))
+            positions = [tuple(float(value) for value in answer['data'].split(',')) for answer in answers]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+
+        truth = self.captchas[session['captcha']][2]
+        correct = form.get('pow_answer') == session['pow_answer'] and len(positions) == len(truth) and all(
+            ((x - tx) ** 2 + (y - ty) ** 2) ** 0.5 <= ANSWER_TOLERANCE
+            for (x, y), (tx, ty) in zip(positions, truth)
+        )
+        if correct and not self.should_fail(self.verify_failure_rate):
+            with self._lock:
+                self.sessions.pop(sess, None)
+            return True
+        return False
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """模拟验证码接口和雨云接口"""
+
+    protocol_version = 'HTTP/1.1'
+    state: StubState = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, body, content_type='application/json', status=200):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(body or '{}')
+        return {key: values[0] for key, values in parse_qs(body).items()}
+
+    def handle_request(self, method):
+        state = self.state
+        path = urlsplit(self.path).path
+        form = self.read_form() if method == 'POST' else {}
+        state.count(f"{method} {path if not path.startswith('/img/') else '/img'}")
+
+        state.delay()
+        if state.should_fail(state.failure_rate):
+            state.count('failed')
+            return self.send_body({'code': 503, 'message': 'stub failure'}, status=503)
+
+        if method == 'GET' and path == '/cap_union_prehandle':
+            sess, index, pow_cfg = state.new_session()
+            data = {
+                'sess': sess,
+                'data': {
+                    'comm_captcha_cfg': {'tdc_path': '/tdc.js', 'pow_cfg': pow_cfg},
+                    'dyn_show_info': state.dyn_show_info(index)
+                }
+            }
+            return self.send_body(f"({json.dumps(data)})", 'text/javascript')
+
+        if method == 'POST' and path == '/cap_union_new_getsig':
+            index = state.refresh_session(form.get('sess'))
+            if index is None:
+                return self.send_body({'ret': 1, 'msg': 'invalid sess'})
+            return self.send_body({'ret': 0, 'sess': form.get('sess'), 'data': state.dyn_show_info(index)})
+
+        if method == 'GET' and path.startswith('/img/'):
+            parts = path.split('/')
+            try:
+                index = int(parts[3].split('.')[0])
+                bg, sprite, _ = state.captchas[index]
+            except (IndexError, ValueError):
+                return self.send_body({'error': 'not found'}, status=404)
+            return self.send_body(bg if parts[2] == 'bg' else sprite, 'image/jpeg')
+
+        if method == 'GET' and path == '/tdc.js':
+            return self.send_body(STUB_TDC_SCRIPT, 'application/javascript')
+
+        if method == 'POST' and path == '/cap_union_new_verify':
+            sess = form.get('sess')
+            if state.check_answer(sess, form):
+                state.count('verify_success')
+                return self.send_body({'errorCode': '0', 'ticket': secrets.token_hex(16), 'randstr': '@load'})
+            state.count('verify_failure')
+            return self.send_body({'errorCode': '50', 'sess': sess})
+
+        if method == 'GET' and path == '/user/csrf':
+            return self.send_body({'code': 200, 'data': 'load-test-csrf'})
+
+        if path == '/user/reward/tasks':
+            if method == 'GET':
+                return self.send_body({'code': 200, 'data': [{'Name': '每日签到', 'Status': 1}]})
+            if form.get('vticket') and form.get('vrandstr'):
+                return self.send_body({'code': 200, 'data': 'ok'})
+            return self.send_body({'code': 30011, 'message': '验证码错误'})
+
+        return self.send_body({'error': 'not found'}, status=404)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def start_stub_server(state, host='127.0.0.1', port=0):
+    """在后台线程中启动模拟服务器，返回 (服务器, 地址)"""
+    handler = type('Handler', (StubHandler,), {'state': state})
+    server = StubServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def write_config(stub_url, concurrency):
+    """生成指向模拟服务器的临时配置文件"""
+    folder = tempfile.mkdtemp(prefix='rainyun-load-')
+    path = os.path.join(folder, 'config.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'auth': {'x-api-key': 'load-test'},
+            'endpoints': {'api': stub_url, 'captcha': stub_url},
+            # 所有请求都发往同一个主机，不限制频率，连接池按并发数量设置
+            'http': {'rate_limit': 0, 'pool_maxsize': max(10, concurrency)},
+            'concurrency': 1
+        }, f, indent=4)
+    return path
+
+
+def main_logic_operation(config_path, operation, method):
+    """直接调用 MainLogic 执行一次操作"""
+    from src.main import MainLogic
+
+    main_logic = MainLogic(config_path)
+
+    def run():
+        if operation == 'auto_check_in':
+            return main_logic.auto_check_in(force=True, match_method=method)
+        if operation == 'complete_captcha':
+            return main_logic.complete_captcha(match_method=method)
+        return main_logic.get_check_in_status()
+
+    return run
+
+
+def web_operation(web_url, operation, method, concurrency):
+    """请求网页接口执行一次操作"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=max(10, concurrency))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    url = web_url.rstrip('/') + OPERATIONS[operation][0]
+
+    def run():
+        response = session.post(url, json={'method': method, 'force': True}, timeout=120)
+        return response.json()
+
+    return run
+
+
+def start_web_server(config_path):
+    """在后台线程中启动网页服务，使用指向模拟服务器的配置，返回地址"""
+    import socket
+    import uvicorn
+    import src.web as web
+
+    web.config_path = config_path
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(web.app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def run_load(run, operation, requests_count, concurrency):
+    """
+    以指定并发数量执行操作
+
+    返回:
+        {'requests', 'success', 'errors', 'throughput', 'latency', 'error_samples'}
+    """
+    is_success = OPERATIONS[operation][1]
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+
+    def task(_):
+        start = time.perf_counter()
+        try:
+            result = run()
+            error = None if isinstance(result, dict) and is_success(result) else json.dumps(
+                result, ensure_ascii=False)[:200]
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:200]
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load') as executor:
+        list(executor.map(task, range(requests_count)))
+    elapsed = time.perf_counter() - start_time
+
+    error_count = sum(errors.values())
+    return {
+        'requests': requests_count,
+        'success': requests_count - error_count,
+        'errors': error_count,
+        'elapsed': round(elapsed, 3),
+        'throughput': round(requests_count / elapsed, 3) if elapsed else None,
+        'latency': summarize(latencies),
+        'error_samples': dict(sorted(errors.items(), key=lambda item: -item[1])[:5])
+    }
+
+
+def print_results(results):
+    latency = results['latency']
+    print(f"\n请求数: {results['requests']}，成功: {results['success']}，失败: {results['errors']}，"
+          f"耗时: {results['elapsed']:.2f} 秒")
+    print(f"吞吐量: {results['throughput'] or 0:.2f} 次/秒")
+    print(f"延迟(ms): 平均 {latency.get('mean', 0):.1f}，p50 {latency.get('p50', 0):.1f}，"
+          f"p90 {latency.get('p90', 0):.1f}，p99 {latency.get('p99', 0):.1f}，最大 {latency.get('max', 0):.1f}")
+    if results['error_samples']:
+        print("失败原因:")
+        for error, count in results['error_samples'].items():
+            print(f"  {count} 次: {error}")
+    if results.get('stub'):
+        print(f"模拟服务器请求统计: {json.dumps(results['stub'], ensure_ascii=False)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='使用本地模拟的验证码和雨云接口进行压力测试')
+    parser.add_argument('--target', type=str, default='main', choices=['main', 'web'],
+                        help='测试对象，main 直接调用 MainLogic，web 请求网页接口，默认为 main')
+    parser.add_argument('--operation', type=str, default='auto_check_in', choices=list(OPERATIONS),
+                        help='执行的操作，默认为 auto_check_in')
+    parser.add_argument('--method', type=str, default='template', choices=MATCH_METHODS,
+                        help='验证码识别方法，默认为 template')
+    parser.add_argument('--requests', type=int, default=50, help='总请求数，默认为 50')
+    parser.add_argument('--concurrency', type=int, default=4, help='同时进行的请求数，默认为 4')
+    parser.add_argument('--warmup', type=int, default=1, help='不计入结果的预热请求数，默认为 1')
+    parser.add_argument('--latency', type=float, default=50, help='模拟接口的平均延迟（毫秒），默认为 50')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延迟的随机浮动比例，默认为 0.2')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='模拟接口返回 503 的比例，默认为 0')
+    parser.add_argument('--verify-failure-rate', type=float, default=0.0,
+                        help='答案正确时验证码仍校验失败的比例，默认为 0')
+    parser.add_argument('--captchas', type=int, default=8, help='模拟验证码的数量，默认为 8')
+    parser.add_argument('--pow-max', type=int, default=20000, help='模拟 PoW 答案的上限，默认为 20000')
+    parser.add_argument('--stub-only', action='store_true', help='只启动模拟服务器，不进行测试')
+    parser.add_argument('--stub-port', type=int, default=0, help='模拟服务器端口，默认随机')
+    parser.add_argument('--web-url', type=str, default=None,
+                        help='测试已启动的网页服务（其配置的 endpoints 需指向模拟服务器），默认在本进程中启动')
+    parser.add_argument('--output', type=str, default=None, help='保存结果的 JSON 文件')
+    args = parser.parse_args()
+
+    state = StubState(
+        latency=args.latency / 1000,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        verify_failure_rate=args.verify_failure_rate,
+        captchas=args.captchas,
+        pow_max=args.pow_max
+    )
+    server, stub_url = start_stub_server(state, port=args.stub_port)
+    print(f"模拟服务器已启动: {stub_url}")
+
+    if args.stub_only:
+        print(f'在配置文件中设置 "endpoints": {{"api": "{stub_url}", "captcha": "{stub_url}"}} 即可使用，按 Ctrl+C 退出')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+            return
+
+    # 提前导入识别依赖，避免第一批请求等待导入
+    from src.main import load_captcha_dependencies
+
+    load_captcha_dependencies()
+
+    config_path = write_config(stub_url, args.concurrency)
+    if args.target == 'web':
+        web_url = args.web_url or start_web_server(config_path)
+        print(f"测试网页服务: {web_url}")
+        run = web_operation(web_url, args.operation, args.method, args.concurrency)
+    else:
+        run = main_logic_operation(config_path, args.operation, args.method)
+
+    if args.warmup > 0:
+        run_load(run, args.operation, args.warmup, 1)
+    state.stats.clear()
+
+    print(f"执行 {args.operation}，共 {args.requests} 次，并发 {args.concurrency} ...")
+    results = run_load(run, args.operation, args.requests, args.concurrency)
+    results['stub'] = dict(state.stats)
+    print_results(results)
+    server.shutdown()
+
+    if args.output:
+        results.update({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'target': args.target,
+            'operation': args.operation,
+            'method': args.method,
+            'concurrency': args.concurrency,
+            'stub_latency': args.latency,
+            'failure_rate': args.failure_rate,
+            'verify_failure_rate': args.verify_failure_rate
+        })
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+    sys.exit(0 if results['errors'] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
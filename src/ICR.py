@@ -1,4 +1,6 @@
+import threading
 import time
+from functools import lru_cache
 from pathlib import Path
 from typing import Union, BinaryIO, List, Tuple, Literal
 from math import sin, cos, radians, fabs
@@ -6,6 +8,18 @@ from math import sin, cos, radians, fabs
 import cv2
 import numpy as np
 
+from src.assignment import ranked_assignments
+from src.image_cache import content_key, freeze, image_cache
+from src.match_methods import MATCH_METHODS
+from src.metrics import ICR_SOLVE_SECONDS
+from src.timing import NULL_TIMINGS
+from src.rect_cluster import (
+    should_merge, merge_overlapping_rectangles, merge_close_rectangles, naive_merge_rectangles
+)
+
+# sprite图像匹配前的放大倍数
+SPRITE_SCALE = 1.55
+
 
 def load_image(image_data):
     """
@@ -56,46 +70,6 @@ def load_and_preprocess(image_data: Union[str, Path, bytes, BinaryIO, np.ndarray
     return cv2.inRange(img, (0, 0, 0), (threshold, threshold, threshold))
 
 
-def should_merge(rect1: Tuple[int, int, int, int], rect2: Tuple[int, int, int, int],
-                 overlap_threshold: float = 0.0) -> bool:
-    """判断两个矩形是否应该合并
-
-    Args:
-        rect1: 第一个矩形 (x, y, width, height)
-        rect2: 第二个矩形 (x, y, width, height)
-        overlap_threshold: 重叠面积占较小矩形面积的比例阈值
-
-    Returns:
-        bool: 如果应该合并返回True，否则返回False
-    """
-    x1, y1, w1, h1 = rect1
-    x2, y2, w2, h2 = rect2
-
-    # 计算两个矩形的交集区域
-    x_left = max(x1, x2)
-    y_top = max(y1, y2)
-    x_right = min(x1 + w1, x2 + w2)
-    y_bottom = min(y1 + h1, y2 + h2)
-
-    if x_right <= x_left or y_bottom <= y_top:
-        return False  # 没有交集
-
-    # 如果阈值为0，只要有重叠就合并
-    if overlap_threshold == 0:
-        return True
-
-    # 计算交集面积
-    intersection_area = (x_right - x_left) * (y_bottom - y_top)
-
-    # 计算两个矩形中较小矩形的面积
-    area1 = w1 * h1
-    area2 = w2 * h2
-    min_area = min(area1, area2)
-
-    # 如果交集面积超过较小矩形面积的阈值比例，则合并
-    return intersection_area > overlap_threshold * min_area
-
-
 def merge_rectangles(rectangles: List[Tuple[int, int, int, int]],
                      overlap_threshold: float = 0.0) -> List[Tuple[int, int, int, int]]:
     """合并重叠的矩形
@@ -107,126 +81,11 @@ def merge_rectangles(rectangles: List[Tuple[int, int, int, int]],
     Returns:
         合并后的矩形列表
     """
-    if not rectangles:
-        return []
-
-    # 创建一个副本以避免修改原始列表
-    rects = [rect for rect in rectangles]
-    changed = True
-
-    # 持续合并直到没有更多合并发生
-    while changed:
-        changed = False
-        new_rects = []
-        merged_indices = set()
-
-        for i in range(len(rects)):
-            if i in merged_indices:
-                continue
-
-            current = rects[i]
-            merged_rect = current
-
-            # 尝试与后面的所有矩形合并
-            for j in range(i + 1, len(rects)):
-                if j in merged_indices:
-                    continue
-
-                candidate = rects[j]
-                if should_merge(merged_rect, candidate, overlap_threshold):
-                    # 计算合并后的矩形边界
-                    x_min = min(merged_rect[0], candidate[0])
-                    y_min = min(merged_rect[1], candidate[1])
-                    x_max = max(merged_rect[0] + merged_rect[2], candidate[0] + candidate[2])
-                    y_max = max(merged_rect[1] + merged_rect[3], candidate[1] + candidate[3])
-                    merged_rect = (x_min, y_min, x_max - x_min, y_max - y_min)
-                    merged_indices.add(j)
-                    changed = True
-
-            new_rects.append(merged_rect)
-
-        rects = new_rects
-
-    return rects
-
-
-def merge_close_rectangles(rectangles, max_distance):
-    """
-    合并边缘距离相近的矩形
-
-    参数:
-        rectangles: 矩形列表，每个矩形表示为(x, y, w, h)
-        max_distance: 最大合并距离
-
-    返回:
-        合并后的矩形列表
-    """
-
-    # 我们需要一个辅助函数来计算两个矩形之间的最小距离
-    def rect_distance(r1, r2):
-        # 矩形1的坐标
-        x1, y1, w1, h1 = r1
-        x1_end, y1_end = x1 + w1, y1 + h1
-
-        # 矩形2的坐标
-        x2, y2, w2, h2 = r2
-        x2_end, y2_end = x2 + w2, y2 + h2
-
-        # 计算水平距离
-        if x1_end < x2:
-            dx = x2 - x1_end
-        elif x2_end < x1:
-            dx = x1 - x2_end
-        else:
-            dx = 0
-
-        # 计算垂直距离
-        if y1_end < y2:
-            dy = y2 - y1_end
-        elif y2_end < y1:
-            dy = y1 - y2_end
-        else:
-            dy = 0
-
-        # 返回欧几里得距离
-        return (dx ** 2 + dy ** 2) ** 0.5
-
-    changed = True
-    while changed and len(rectangles) > 1:
-        changed = False
-        new_rectangles = []
-        merged = [False] * len(rectangles)
-
-        for i in range(len(rectangles)):
-            if merged[i]:
-                continue
-
-            rect1 = rectangles[i]
-            current_rect = rect1
-
-            for j in range(i + 1, len(rectangles)):
-                if merged[j]:
-                    continue
-
-                rect2 = rectangles[j]
-                distance = rect_distance(current_rect, rect2)
-
-                if distance <= max_distance:
-                    # 合并两个矩形
-                    x = min(current_rect[0], rect2[0])
-                    y = min(current_rect[1], rect2[1])
-                    w = max(current_rect[0] + current_rect[2], rect2[0] + rect2[2]) - x
-                    h = max(current_rect[1] + current_rect[3], rect2[1] + rect2[3]) - y
-                    current_rect = (x, y, w, h)
-                    merged[j] = True
-                    changed = True
-
-            new_rectangles.append(current_rect)
-            merged[i] = True
-
-        rectangles = new_rectangles
+    if overlap_threshold == 0:
+        # 扫描线 + 并查集合并，结果与逐对合并相同
+        return merge_overlapping_rectangles(rectangles)
 
-    return rectangles
+    return naive_merge_rectangles(rectangles, overlap_threshold)
 
 
 def extract_black_regions(
@@ -234,7 +93,8 @@ def extract_black_regions(
         min_area: int = 100,
         merged: bool = True,
         merge_distance: int = 0,
-        sort_mode: Literal["area-desc", "area-asc", "position-tl", "position-l"] = "area-desc"
+        sort_mode: Literal["area-desc", "area-asc", "position-tl", "position-l"] = "area-desc",
+        scale: int = 1
 ) -> List[Tuple[int, int, int, int]]:
     """
     提取二值图像中的黑色区域(矩形)
@@ -249,6 +109,7 @@ def extract_black_regions(
             "area-asc": 按面积从小到大
             "position-tl": 按位置从上到下、从左到右
             "position-l": 按位置从左到右
+        scale: 二值图像的降采样倍数，矩形会放大到原始尺寸后再过滤和合并
 
     返回:
         矩形列表，每个矩形表示为(x, y, w, h)
@@ -259,7 +120,7 @@ def extract_black_regions(
     # 获取每个轮廓的边界矩形并过滤掉太小的区域
     rectangles = []
     for cnt in contours:
-        x, y, w, h = cv2.boundingRect(cnt)
+        x, y, w, h = (v * scale for v in cv2.boundingRect(cnt))
         if w * h >= min_area:  # 忽略面积太小的区域
             rectangles.append((x, y, w, h))
 
@@ -351,43 +212,123 @@ def opencv_rotate(image, angle, scale=1.0):
     return rotated_image
 
 
-def analyze_rotated_regions(sprite_mask, sprite_black_regions):
-    """分析每个sprite黑色区域在不同旋转角度下的轮廓"""
-    rotation_data = []
+# sprite区域旋转分析的角度范围：-45度到45度，步长1度
+ROTATION_ANGLES = tuple(range(-45, 46))
 
-    for region_idx, (x, y, w, h) in enumerate(sprite_black_regions):
-        # 提取当前区域的ROI
-        region_roi = sprite_mask[y:y + h, x:x + w]
 
-        # 存储当前区域的所有旋转信息
-        region_data = {
-            'original_region': (x, y, w, h),
-            'rotations': []
-        }
+@lru_cache(maxsize=64)
+def rotation_matrices(height: int, width: int, angles: Tuple[int, ...] = ROTATION_ANGLES):
+    """
+    计算尺寸为 (height, width) 的图像在各角度下的旋转矩阵与画布尺寸
 
-        # 从-45度到45度，步长1度
-        for angle in range(-45, 46):
-            # 旋转图像
-            rotated_img = opencv_rotate(region_roi, -angle)
+    与 opencv_rotate(image, -angle) 使用的矩阵和画布尺寸相同。结果只与尺寸和角度有关，因此会被缓存复用。
 
-            # 获取轮廓的边界矩形
-            rects = extract_black_regions(rotated_img, 0)
+    返回:
+        (matrices, canvas_h, canvas_w)，matrices 为 (旋转矩阵, 画布宽, 画布高) 列表，
+        canvas_h、canvas_w 为所有角度中最大的画布尺寸
+    """
+    matrices = []
+    center = (width / 2, height / 2)
 
-            # 合并所有矩形
-            if rects:
-                x_r, y_r, w_r, h_r = rects[0]  # 取第一个也是唯一一个矩形
-                aspect_ratio = round(float(w_r) / h_r, 12) if h_r != 0 else float('inf')
+    for angle in angles:
+        rotation_matrix = cv2.getRotationMatrix2D(center, -angle, 1.0)
+
+        new_height = int(width * fabs(sin(radians(-angle))) + height * fabs(cos(radians(-angle))))
+        new_width = int(height * fabs(sin(radians(-angle))) + width * fabs(cos(radians(-angle))))
+
+        rotation_matrix[0, 2] += (new_width - width) / 2
+        rotation_matrix[1, 2] += (new_height - height) / 2
+
+        matrices.append((rotation_matrix, new_width, new_height))
+
+    canvas_h = max(new_height for _, _, new_height in matrices)
+    canvas_w = max(new_width for _, new_width, _ in matrices)
+    return matrices, canvas_h, canvas_w
 
-                # 存储旋转信息
-                rotation_info = {
-                    'angle': angle,
-                    'rect': (x_r, y_r, w_r, h_r),
-                    'aspect_ratio': aspect_ratio,
-                    'rotated_image': rotated_img
-                }
-                region_data['rotations'].append(rotation_info)
 
-        rotation_data.append(region_data)
+def build_rotation_bank(region_roi, angles=ROTATION_ANGLES):
+    """
+    批量构建区域在各角度下旋转并紧密裁剪后的掩码（旋转库）
+
+    所有角度旋转到同一块预分配的堆叠数组中（画布左上角对齐），旋转矩阵按尺寸缓存，
+    再通过行/列 any 归约向量化计算每个角度的边界矩形，代替逐角度的
+    opencv_rotate + extract_black_regions。匹配时按行号访问各数组，不再为每个角度构建字典。
+
+    参数:
+        region_roi: 区域二值掩码
+        angles: 旋转角度序列
+
+    返回:
+        字典，包含:
+            angles: 有效角度数组 (N,)
+            rects: 每个角度在旋转画布中的边界矩形数组 (N, 4)，(x, y, w, h)
+            aspect_ratios: 宽高比数组 (N,)
+            stack: 所有角度旋转后的掩码 (N, H, W)，共用一块内存
+            masks: 每个角度紧密裁剪后的掩码列表（stack 的视图）
+            first_angle: 请求的最小角度
+            index: 角度到行号的查找表，第 k 项为角度 first_angle + k 的行号，无效角度为 -1
+    """
+    angles = tuple(int(angle) for angle in angles)
+    height, width = region_roi.shape[:2]
+    matrices, canvas_h, canvas_w = rotation_matrices(height, width, angles)
+
+    # 每个角度直接写入堆叠数组中对应画布大小的视图，不再为每个角度单独分配图像
+    stack = np.zeros((len(angles), canvas_h, canvas_w), dtype=region_roi.dtype)
+    for i, (rotation_matrix, new_width, new_height) in enumerate(matrices):
+        cv2.warpAffine(region_roi, rotation_matrix, (new_width, new_height),
+                       dst=stack[i, :new_height, :new_width], borderValue=(0, 0, 0))
+
+    # 向量化计算每个角度非零像素的边界矩形
+    non_zero = stack > 0
+    rows_any = non_zero.any(axis=2)
+    cols_any = non_zero.any(axis=1)
+    valid = rows_any.any(axis=1)
+
+    y0 = rows_any.argmax(axis=1)
+    y1 = canvas_h - rows_any[:, ::-1].argmax(axis=1)
+    x0 = cols_any.argmax(axis=1)
+    x1 = canvas_w - cols_any[:, ::-1].argmax(axis=1)
+    rects = np.stack([x0, y0, x1 - x0, y1 - y0], axis=1)[valid]
+
+    stack = stack[valid]
+    masks = [stack[i, y:y + h, x:x + w] for i, (x, y, w, h) in enumerate(rects)]
+
+    valid_angles = np.asarray(angles)[valid]
+    first_angle = min(angles) if angles else 0
+    index = np.full(max(angles) - first_angle + 1 if angles else 0, -1, dtype=np.intp)
+    index[valid_angles - first_angle] = np.arange(len(valid_angles))
+
+    return {
+        'angles': valid_angles,
+        'rects': rects,
+        'aspect_ratios': np.round(rects[:, 2] / rects[:, 3], 12),
+        'stack': stack,
+        'masks': masks,
+        'first_angle': first_angle,
+        'index': index
+    }
+
+
+def bank_row(bank, angle):
+    """角度在旋转库中的行号，角度超出范围或该角度没有有效区域时返回 -1"""
+    offset = angle - bank['first_angle']
+    if 0 <= offset < len(bank['index']):
+        return int(bank['index'][offset])
+    return -1
+
+
+def analyze_rotated_regions(sprite_mask, sprite_black_regions):
+    """分析每个sprite黑色区域在不同旋转角度下的轮廓"""
+    rotation_data = []
+
+    for x, y, w, h in sprite_black_regions:
+        # 一次性构建当前区域所有角度的旋转库
+        bank = build_rotation_bank(sprite_mask[y:y + h, x:x + w])
+
+        rotation_data.append({
+            'original_region': (x, y, w, h),
+            'bank': bank
+        })
 
     return rotation_data
 
@@ -412,26 +353,25 @@ def display_rotation_analysis(rotation_data, original_sprite):
         plt.subplot(2, 1, 2)
 
         # 计算最大宽度和高度，确定网格单元大小
-        max_width = max(rot['rect'][2] for rot in region_data['rotations'])
-        max_height = max(rot['rect'][3] for rot in region_data['rotations'])
+        bank = region_data['bank']
+        max_width = int(bank['rects'][:, 2].max())
+        max_height = int(bank['rects'][:, 3].max())
         cell_size = max(max_width, max_height) + 20  # 加上边距
 
         # 创建网格参数
-        num_angles = len(region_data['rotations'])
+        num_angles = len(bank['angles'])
         cols = 10  # 每行显示10个角度
         rows = (num_angles + cols - 1) // cols
 
         # 创建网格图像
         grid = np.zeros((rows * cell_size, cols * cell_size), dtype=np.uint8) + 200  # 灰色背景
 
-        for i, rot in enumerate(region_data['rotations']):
+        for i, (angle, rect, roi) in enumerate(zip(bank['angles'], bank['rects'], bank['masks'])):
             row = i // cols
             col = i % cols
 
-            # 获取旋转后的图像和其矩形信息
-            rotated_img = rot['rotated_image']
-            x_r, y_r, w_r, h_r = rot['rect']
-            roi = rotated_img[y_r:y_r + h_r, x_r:x_r + w_r]
+            # 获取裁剪后的旋转图像和其矩形信息
+            x_r, y_r, w_r, h_r = rect
 
             # 计算在网格中的位置(居中放置)
             y_start = row * cell_size + (cell_size - h_r) // 2
@@ -443,7 +383,7 @@ def display_rotation_analysis(rotation_data, original_sprite):
             # 添加角度标签(放在图像下方)
             label_y = row * cell_size + cell_size - 5
             label_x = col * cell_size + 5
-            cv2.putText(grid, f"{rot['angle']} deg", (label_x, label_y),
+            cv2.putText(grid, f"{angle} deg", (label_x, label_y),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.4, 0, 1)  # 黑色文字
 
         plt.imshow(grid, cmap='gray', vmin=0, vmax=255)
@@ -456,9 +396,9 @@ def display_rotation_analysis(rotation_data, original_sprite):
         # 打印旋转信息
         print(f"\nRegion {idx + 1} Rotation Analysis:")
         print("Angle | Width | Height | Aspect Ratio")
-        for rot in region_data['rotations']:
-            x_r, y_r, w_r, h_r = rot['rect']
-            print(f"{rot['angle']:5}° | {w_r:5} | {h_r:6} | {rot['aspect_ratio']:.12f}")
+        for angle, rect, aspect_ratio in zip(bank['angles'], bank['rects'], bank['aspect_ratios']):
+            x_r, y_r, w_r, h_r = rect
+            print(f"{angle:5}° | {w_r:5} | {h_r:6} | {aspect_ratio:.12f}")
 
 
 def binary_similarity(img1, img2):
@@ -507,88 +447,349 @@ def template_search(rotated_roi, bg_roi, bg_rect, w_r, h_r):
     return best_bg_sub_rect, max_similarity
 
 
-def match_sprite_to_background(bg_black_regions, preprocessed_bg, rotation_data, method='template'):
+# fft 方法每批同时计算的模板数量，用于限制内存占用
+FFT_BATCH_SIZE = 32
+
+
+def fit_template(rotated_roi, bg_w, bg_h):
+    """如果旋转后的sprite区域比背景区域大，只缩小较大的维度，使其能在背景区域中滑动"""
+    h_r, w_r = rotated_roi.shape[:2]
+    if h_r > bg_h or w_r > bg_w:
+        # 计算新的尺寸，只缩小较大的维度
+        new_w = min(w_r, bg_w)  # 如果w_r > bg_w则缩小宽度，否则保持
+        new_h = min(h_r, bg_h)  # 如果h_r > bg_h则缩小高度，否则保持
+
+        # 缩放rotated_roi
+        rotated_roi = cv2.resize(rotated_roi, (new_w, new_h), interpolation=cv2.INTER_NEAREST)
+    return rotated_roi
+
+
+def fft_similarity_maps(templates, bg_roi):
     """
-    将sprite区域与背景黑色区域进行匹配
+    通过批量 FFT 互相关计算多个模板在背景ROI上每个位置的二值相似度
+
+    结果与 brute_search 逐窗口调用 binary_similarity 完全相同：对于二值图像，
+    相同像素数 = 模板面积 - 模板前景数 - 窗口前景数 + 2 * 互相关，
+    互相关对补零堆叠后的模板批量做 rfft2 计算，窗口前景数通过积分图计算。
 
     参数:
-        bg_black_regions: 背景中的黑色区域列表
+        templates: 模板列表，每个模板的尺寸都不能超过 bg_roi
+        bg_roi: 背景ROI
+
+    返回:
+        相似度图列表（百分比），第 i 个的形状为 (bg_h - h_i + 1, bg_w - w_i + 1)
+    """
+    bg_h, bg_w = bg_roi.shape[:2]
+    bg_binary = (bg_roi > 127).astype(np.uint8)
+    integral = cv2.integral(bg_binary)
+
+    # 补零到便于 FFT 计算的尺寸
+    fft_shape = (cv2.getOptimalDFTSize(bg_h), cv2.getOptimalDFTSize(bg_w))
+    bg_fft = np.fft.rfft2(bg_binary, s=fft_shape)
+
+    maps = []
+    for start in range(0, len(templates), FFT_BATCH_SIZE):
+        batch = templates[start:start + FFT_BATCH_SIZE]
+
+        # 所有模板补零到相同尺寸后堆叠，模板不超过背景尺寸，循环互相关在有效位置上不会回绕
+        stack = np.zeros((len(batch),) + fft_shape, dtype=np.float64)
+        for i, template in enumerate(batch):
+            h, w = template.shape[:2]
+            stack[i, :h, :w] = template > 127
+
+        correlation = np.fft.irfft2(np.conj(np.fft.rfft2(stack)) * bg_fft, s=fft_shape)
+
+        for i, template in enumerate(batch):
+            h, w = template.shape[:2]
+            valid_h, valid_w = bg_h - h + 1, bg_w - w + 1
+
+            # 每个窗口内背景的前景像素数
+            window_sum = (integral[h:, w:] - integral[:valid_h, w:]
+                          - integral[h:, :valid_w] + integral[:valid_h, :valid_w])
+
+            matching_pixels = (h * w - np.count_nonzero(template > 127) - window_sum
+                               + 2 * np.rint(correlation[i, :valid_h, :valid_w]))
+            maps.append((matching_pixels / (h * w)) * 100)
+
+    return maps
+
+
+def fft_matches(bg_black_regions, preprocessed_bg, rotation_data):
+    """
+    使用批量 FFT 互相关计算所有sprite旋转角度与所有背景区域的匹配，结果与 brute 方法相同
+
+    返回:
+        所有匹配列表，顺序与逐个比较时相同
+    """
+    results = [[None] * len(bg_black_regions) for _ in rotation_data]
+
+    # 每个背景区域只计算一次 FFT，同时与所有sprite的所有旋转角度做互相关
+    for bg_idx, bg_rect in enumerate(bg_black_regions):
+        bg_x, bg_y, bg_w, bg_h = bg_rect
+        bg_roi = preprocessed_bg[bg_y:bg_y + bg_h, bg_x:bg_x + bg_w]
+
+        templates = [
+            fit_template(mask, bg_w, bg_h)
+            for sprite_data in rotation_data
+            for mask in sprite_data['bank']['masks']
+        ]
+        similarity_maps = iter(zip(templates, fft_similarity_maps(templates, bg_roi)))
+
+        for sprite_idx, sprite_data in enumerate(rotation_data):
+            results[sprite_idx][bg_idx] = [next(similarity_maps) for _ in sprite_data['bank']['masks']]
+
+    all_matches = []
+    for sprite_idx, sprite_data in enumerate(rotation_data):
+        for bg_idx, bg_rect in enumerate(bg_black_regions):
+            bg_x, bg_y = bg_rect[:2]
+            for angle, (template, similarity_map) in zip(sprite_data['bank']['angles'], results[sprite_idx][bg_idx]):
+                # 与 brute_search 相同，取按行优先顺序第一个最大值
+                y, x = np.unravel_index(np.argmax(similarity_map), similarity_map.shape)
+                h_r, w_r = template.shape[:2]
+                all_matches.append({
+                    'sprite_idx': sprite_idx,
+                    'bg_idx': bg_idx,
+                    'angle': int(angle),
+                    'similarity': float(similarity_map[y, x]),
+                    'sprite_rect': sprite_data['original_region'],
+                    'bg_rect': (bg_x + int(x), bg_y + int(y), w_r, h_r),
+                    'rotated_sprite': template
+                })
+
+    return all_matches
+
+
+# coarse_fine 方法参数：粗搜索角度步长、每个sprite保留的候选数、精搜索角度半径
+COARSE_ANGLE_STEP = 5
+COARSE_TOP_K = 5
+FINE_ANGLE_RADIUS = COARSE_ANGLE_STEP - 1
+
+
+def match_rotation(sprite_idx, sprite_data, row, bg_idx, bg_rect, preprocessed_bg, func):
+    """
+    计算单个旋转角度的sprite区域与单个背景区域的匹配
+
+    参数:
+        sprite_idx: sprite区域序号
+        sprite_data: sprite旋转分析数据
+        row: 旋转角度在旋转库中的行号
+        bg_idx: 背景区域序号
+        bg_rect: 背景区域矩形
         preprocessed_bg: 预处理后的二值化背景图像
-        rotation_data: sprite旋转分析数据
-        method: 匹配背景块方法
+        func: 滑动窗口匹配函数，为 None 时使用速度匹配
 
     返回:
-        匹配结果列表，每个元素是一个字典包含匹配信息
+        匹配信息字典
     """
-    func = {
-        'template': template_search,
-        'brute': brute_search
-    }.get(method, None)
+    # 获取旋转后的有效区域
+    bank = sprite_data['bank']
+    rotated_roi = bank['masks'][row]
+    x_r, y_r, w_r, h_r = (int(v) for v in bank['rects'][row])
 
-    # 存储所有可能的匹配（包括冲突的）
+    # 准备背景ROI
+    bg_x, bg_y, bg_w, bg_h = bg_rect
+    bg_roi = preprocessed_bg[bg_y:bg_y + bg_h, bg_x:bg_x + bg_w]
+
+    if func is None:
+        # 速度匹配
+        # 调整大小使两个ROI相同尺寸
+        max_width = max(w_r, bg_w)
+        max_height = max(h_r, bg_h)
+
+        # 调整sprite ROI
+        sprite_resized = cv2.resize(rotated_roi, (max_width, max_height),
+                                    interpolation=cv2.INTER_NEAREST)
+
+        # 调整背景ROI
+        bg_resized = cv2.resize(bg_roi, (max_width, max_height),
+                                interpolation=cv2.INTER_NEAREST)
+
+        # 计算相似度
+        similarity = binary_similarity(sprite_resized, bg_resized)
+
+        best_bg_sub_rect = bg_rect
+    else:
+        # 检查是否需要调整rotated_roi的大小
+        rotated_roi = fit_template(rotated_roi, bg_w, bg_h)
+        h_r, w_r = rotated_roi.shape[:2]
+
+        # 在bg_roi上滑动窗口进行比较
+        best_bg_sub_rect, similarity = func(rotated_roi, bg_roi, bg_rect, w_r, h_r)
+
+    return {
+        'sprite_idx': sprite_idx,
+        'bg_idx': bg_idx,
+        'angle': int(bank['angles'][row]),
+        'similarity': similarity,
+        'sprite_rect': sprite_data['original_region'],
+        'bg_rect': best_bg_sub_rect,
+        'rotated_sprite': rotated_roi
+    }
+
+
+def coarse_fine_matches(bg_black_regions, preprocessed_bg, rotation_data,
+                        angle_step=COARSE_ANGLE_STEP, top_k=COARSE_TOP_K, radius=FINE_ANGLE_RADIUS):
+    """
+    先粗后精搜索匹配：先在粗角度网格上匹配，每个sprite保留最好的 top_k 个（背景区域, 角度）候选，
+    只在候选角度附近 ±radius 度内精搜索
+
+    返回:
+        (所有匹配列表, 模板匹配次数)
+    """
     all_matches = []
+    evaluations = 0
 
-    # 第一阶段：收集所有可能的匹配
     for sprite_idx, sprite_data in enumerate(rotation_data):
-        # 遍历每个背景区域
+        bank = sprite_data['bank']
+        angles = bank['angles']
+        if not len(angles):
+            continue
+
+        # 粗搜索：只比较网格上的角度
+        coarse_rows = np.flatnonzero((angles - angles.min()) % angle_step == 0)
+
+        evaluated = set()
+        coarse_matches = []
         for bg_idx, bg_rect in enumerate(bg_black_regions):
-            # 比较这些角度
-            for rotation in sprite_data['rotations']:
-                # 获取旋转后的图像
-                rotated_img = rotation['rotated_image']
-                x_r, y_r, w_r, h_r = rotation['rect']
-
-                # 裁剪出旋转后的有效区域
-                rotated_roi = rotated_img[y_r:y_r + h_r, x_r:x_r + w_r]
-
-                # 准备背景ROI
-                bg_x, bg_y, bg_w, bg_h = bg_rect
-                bg_roi = preprocessed_bg[bg_y:bg_y + bg_h, bg_x:bg_x + bg_w]
-
-                if func is None:
-                    # 速度匹配
-                    # 调整大小使两个ROI相同尺寸
-                    max_width = max(w_r, bg_w)
-                    max_height = max(h_r, bg_h)
-
-                    # 调整sprite ROI
-                    sprite_resized = cv2.resize(rotated_roi, (max_width, max_height),
-                                                interpolation=cv2.INTER_NEAREST)
-
-                    # 调整背景ROI
-                    bg_resized = cv2.resize(bg_roi, (max_width, max_height),
-                                            interpolation=cv2.INTER_NEAREST)
-
-                    # 计算相似度
-                    similarity = binary_similarity(sprite_resized, bg_resized)
-
-                    best_bg_sub_rect = bg_rect
-                else:
-                    # 检查是否需要调整rotated_roi的大小
-                    if h_r > bg_h or w_r > bg_w:
-                        # 计算新的尺寸，只缩小较大的维度
-                        new_w = min(w_r, bg_w)  # 如果w_r > bg_w则缩小宽度，否则保持
-                        new_h = min(h_r, bg_h)  # 如果h_r > bg_h则缩小高度，否则保持
-
-                        # 缩放rotated_roi
-                        rotated_roi = cv2.resize(rotated_roi, (new_w, new_h), interpolation=cv2.INTER_NEAREST)
-                        w_r, h_r = new_w, new_h
-
-                    # 在bg_roi上滑动窗口进行比较
-                    best_bg_sub_rect, similarity = func(rotated_roi, bg_roi, bg_rect, w_r, h_r)
-
-                # 存储最佳匹配
+            for row in coarse_rows:
+                coarse_matches.append(match_rotation(
+                    sprite_idx, sprite_data, row, bg_idx, bg_rect, preprocessed_bg, template_search
+                ))
+                evaluated.add((bg_idx, int(angles[row])))
+        evaluations += len(coarse_matches)
+        all_matches.extend(coarse_matches)
+
+        # 精搜索：在最好的候选角度附近逐度比较
+        coarse_matches.sort(key=lambda x_: -x_['similarity'])
+        for candidate in coarse_matches[:top_k]:
+            bg_idx = candidate['bg_idx']
+            bg_rect = bg_black_regions[bg_idx]
+            for angle in range(candidate['angle'] - radius, candidate['angle'] + radius + 1):
+                row = bank_row(bank, angle)
+                if row < 0 or (bg_idx, angle) in evaluated:
+                    continue
+                all_matches.append(match_rotation(
+                    sprite_idx, sprite_data, row, bg_idx, bg_rect, preprocessed_bg, template_search
+                ))
+                evaluated.add((bg_idx, angle))
+                evaluations += 1
+
+    return all_matches, evaluations
+
+
+# pyramid 方法参数：低分辨率搜索的缩小倍数和角度步长、每个sprite保留的候选数、
+# 全分辨率精搜索的角度半径和位置余量（像素）
+PYRAMID_SCALE = 4
+PYRAMID_ANGLE_STEP = 3
+PYRAMID_TOP_K = 4
+PYRAMID_ANGLE_RADIUS = 2
+PYRAMID_MARGIN = 2 * PYRAMID_SCALE
+
+
+def downscale_mask(mask, factor):
+    """按区域平均缩小二值掩码并重新二值化"""
+    height, width = mask.shape[:2]
+    low = cv2.resize(mask, (max(1, width // factor), max(1, height // factor)), interpolation=cv2.INTER_AREA)
+    cv2.threshold(low, 127, 255, cv2.THRESH_BINARY, dst=low)
+    return low
+
+
+def pyramid_matches(bg_black_regions, preprocessed_bg, rotation_data, scale=PYRAMID_SCALE,
+                    angle_step=PYRAMID_ANGLE_STEP, top_k=PYRAMID_TOP_K, radius=PYRAMID_ANGLE_RADIUS,
+                    margin=PYRAMID_MARGIN):
+    """
+    多分辨率匹配：先在缩小 scale 倍的掩码上搜索背景区域和角度，每个sprite保留最好的 top_k 个候选，
+    再在全分辨率下只于候选位置附近 ±margin 像素、候选角度附近 ±radius 度内精搜索
+
+    背景掩码本身由 1/4 分辨率放大得到，低分辨率搜索不会丢失背景信息，模板匹配面积约为全分辨率的 1/16
+
+    返回:
+        (精搜索得到的匹配列表, 模板匹配次数)
+    """
+    all_matches = []
+    evaluations = 0
+
+    # 每个背景区域只缩小一次
+    bg_rois = []
+    for bg_x, bg_y, bg_w, bg_h in bg_black_regions:
+        bg_roi = preprocessed_bg[bg_y:bg_y + bg_h, bg_x:bg_x + bg_w]
+        bg_rois.append((bg_roi, downscale_mask(bg_roi, scale)))
+
+    for sprite_idx, sprite_data in enumerate(rotation_data):
+        bank = sprite_data['bank']
+        angles = bank['angles']
+        if not len(angles):
+            continue
+
+        coarse_templates = [
+            (int(angles[row]), downscale_mask(bank['masks'][row], scale))
+            for row in np.flatnonzero((angles - angles.min()) % angle_step == 0)
+        ]
+
+        # 低分辨率搜索：(相似度, 背景区域序号, 角度, 低分辨率位置)
+        candidates = []
+        for bg_idx, (_, low_bg) in enumerate(bg_rois):
+            low_h, low_w = low_bg.shape[:2]
+            for angle, template in coarse_templates:
+                template = fit_template(template, low_w, low_h)
+                h_t, w_t = template.shape[:2]
+                position, similarity = template_search(template, low_bg, (0, 0, low_w, low_h), w_t, h_t)
+                candidates.append((similarity, bg_idx, angle, position[:2]))
+        evaluations += len(candidates)
+
+        # 全分辨率精搜索：只比较候选位置附近的窗口
+        candidates.sort(key=lambda x_: -x_[0])
+        evaluated = set()
+        for _, bg_idx, coarse_angle, (low_x, low_y) in candidates[:top_k]:
+            bg_x, bg_y, bg_w, bg_h = bg_black_regions[bg_idx]
+            bg_roi = bg_rois[bg_idx][0]
+
+            for angle in range(coarse_angle - radius, coarse_angle + radius + 1):
+                row = bank_row(bank, angle)
+                if row < 0 or (bg_idx, angle) in evaluated:
+                    continue
+                evaluated.add((bg_idx, angle))
+
+                rotated_roi = fit_template(bank['masks'][row], bg_w, bg_h)
+                h_r, w_r = rotated_roi.shape[:2]
+
+                # 搜索窗口至少能容纳模板，且不超出背景区域
+                x0 = min(max(0, low_x * scale - margin), bg_w - w_r)
+                y0 = min(max(0, low_y * scale - margin), bg_h - h_r)
+                x1 = min(bg_w, max(x0 + w_r, low_x * scale + w_r + margin))
+                y1 = min(bg_h, max(y0 + h_r, low_y * scale + h_r + margin))
+
+                best_bg_sub_rect, similarity = template_search(
+                    rotated_roi, bg_roi[y0:y1, x0:x1], (bg_x + x0, bg_y + y0, x1 - x0, y1 - y0), w_r, h_r
+                )
+                evaluations += 1
+
                 all_matches.append({
                     'sprite_idx': sprite_idx,
                     'bg_idx': bg_idx,
-                    'angle': rotation['angle'],
+                    'angle': angle,
                     'similarity': similarity,
                     'sprite_rect': sprite_data['original_region'],
                     'bg_rect': best_bg_sub_rect,
                     'rotated_sprite': rotated_roi
                 })
 
-    # 第二阶段：解决冲突，选择最佳匹配
+    return all_matches, evaluations
+
+
+def resolve_matches(all_matches, sprite_count, bg_count, exclusive_bg=False):
+    """
+    解决冲突，按相似度从高到低为每个sprite选择最佳匹配
+
+    参数:
+        all_matches: 所有可能的匹配（包括冲突的）
+        sprite_count: sprite区域数量
+        bg_count: 背景区域数量
+        exclusive_bg: 每个背景区域是否只能匹配一个sprite
+
+    返回:
+        按 sprite_idx 排序的最终匹配列表
+    """
     final_matches = []
     used_bg_regions = set()
     used_sprites = set()
@@ -606,7 +807,7 @@ def match_sprite_to_background(bg_black_regions, preprocessed_bg, rotation_data,
             continue
 
         # 如果不使用滑动窗口匹配，跳过同一个背景区域
-        if func is None and bg_idx in used_bg_regions:
+        if exclusive_bg and bg_idx in used_bg_regions:
             continue
 
         # 添加到最终匹配结果
@@ -615,16 +816,161 @@ def match_sprite_to_background(bg_black_regions, preprocessed_bg, rotation_data,
         used_bg_regions.add(bg_idx)
 
         # 如果所有sprite或背景区域都已匹配，提前退出
-        if len(used_sprites) == len(rotation_data):
+        if len(used_sprites) == sprite_count:
             break
 
-        if func is None and len(used_bg_regions) == len(bg_black_regions):
+        if exclusive_bg and len(used_bg_regions) == bg_count:
             break
 
     # 按照 sprite_idx 从小到大排序
-    final_matches = sorted(final_matches, key=lambda x: x.get('sprite_idx', 'inf'))
+    return sorted(final_matches, key=lambda x: x.get('sprite_idx', 'inf'))
+
+
+def rank_matches(all_matches, sprite_count, bg_count, top_k=1):
+    """
+    使用最优分配求总相似度最高的前 top_k 个全局一致的匹配方案
+
+    每对 (sprite, 背景区域) 取相似度最高的角度组成分数矩阵，用匈牙利算法求最优分配，再用 Murty 算法依次求次优分配。
+    无论匹配方法是否允许多个sprite匹配同一背景区域，方案中每个背景区域都只匹配一个sprite，
+    否则次优方案可能把两个sprite放到同一位置，校验必定失败
+
+    参数:
+        all_matches: 所有可能的匹配（包括冲突的）
+        sprite_count: sprite区域数量
+        bg_count: 背景区域数量
+        top_k: 最多返回的方案数量
+
+    返回:
+        [{'score': 总相似度, 'matches': 按 sprite_idx 排序的匹配列表}, ...]，
+        无法为每个sprite都找到匹配时返回空列表
+    """
+    best = {}
+    for match in all_matches:
+        key = (match['sprite_idx'], match['bg_idx'])
+        if key not in best or match['similarity'] > best[key]['similarity']:
+            best[key] = match
+
+    scores = [
+        [best[(i, j)]['similarity'] if (i, j) in best else None for j in range(bg_count)]
+        for i in range(sprite_count)
+    ]
+
+    return [
+        {'score': score, 'matches': [best[(i, j)] for i, j in enumerate(assignment)]}
+        for score, assignment in ranked_assignments(scores, top_k)
+    ]
+
+
+def resolve_alternative_matches(all_matches, best_matches, sprite_count, bg_count):
+    """
+    计算与最佳匹配不同的次优无冲突匹配，每个背景区域只匹配一个sprite
+
+    参数:
+        all_matches: 所有可能的匹配（包括冲突的）
+        best_matches: resolve_matches 得到的最佳匹配
+        sprite_count: sprite区域数量
+        bg_count: 背景区域数量
+
+    返回:
+        按 sprite_idx 排序的次优匹配列表，没有其他完整匹配时返回 None
+    """
+    best_pairs = {(match['sprite_idx'], match['bg_idx']) for match in best_matches}
+
+    # 最优分配的结果可能与贪心得到的最佳匹配相同，取前两个中不同的一个
+    for solution in rank_matches(all_matches, sprite_count, bg_count, 2):
+        if {(match['sprite_idx'], match['bg_idx']) for match in solution['matches']} != best_pairs:
+            return solution['matches']
+
+    return None
+
+
+def collect_matches(bg_black_regions, preprocessed_bg, rotation_data, method='template'):
+    """
+    收集所有sprite区域与背景区域之间可能的匹配（包括冲突的）
+
+    参数:
+        bg_black_regions: 背景中的黑色区域列表
+        preprocessed_bg: 预处理后的二值化背景图像
+        rotation_data: sprite旋转分析数据
+        method: 匹配背景块方法
 
-    return final_matches
+    返回:
+        (所有匹配列表, 模板匹配次数)
+    """
+    if method == 'coarse_fine':
+        # 先粗后精搜索角度
+        return coarse_fine_matches(bg_black_regions, preprocessed_bg, rotation_data)
+
+    if method == 'pyramid':
+        # 低分辨率搜索后在全分辨率下局部精搜索
+        return pyramid_matches(bg_black_regions, preprocessed_bg, rotation_data)
+
+    if method == 'fft':
+        # 批量 FFT 互相关，结果与 brute 相同
+        all_matches = fft_matches(bg_black_regions, preprocessed_bg, rotation_data)
+        return all_matches, len(all_matches)
+
+    func = {
+        'template': template_search,
+        'brute': brute_search
+    }.get(method, None)
+
+    # 存储所有可能的匹配（包括冲突的）
+    all_matches = []
+
+    for sprite_idx, sprite_data in enumerate(rotation_data):
+        # 遍历每个背景区域
+        for bg_idx, bg_rect in enumerate(bg_black_regions):
+            # 比较这些角度
+            for row in range(len(sprite_data['bank']['angles'])):
+                all_matches.append(match_rotation(
+                    sprite_idx, sprite_data, row, bg_idx, bg_rect, preprocessed_bg, func
+                ))
+
+    return all_matches, len(all_matches)
+
+
+def save_candidates(candidates, all_matches, sprite_count, bg_count):
+    """记录计算次优匹配所需的数据"""
+    candidates.update({
+        'all_matches': all_matches,
+        'sprite_count': sprite_count,
+        'bg_count': bg_count
+    })
+
+
+def is_exclusive_method(method):
+    """匹配方法是否不使用滑动窗口（每个背景区域只能匹配一个sprite）"""
+    return method not in ('template', 'brute', 'coarse_fine', 'fft', 'pyramid')
+
+
+def match_sprite_to_background(bg_black_regions, preprocessed_bg, rotation_data, method='template', stats=None,
+                               candidates=None):
+    """
+    将sprite区域与背景黑色区域进行匹配
+
+    参数:
+        bg_black_regions: 背景中的黑色区域列表
+        preprocessed_bg: 预处理后的二值化背景图像
+        rotation_data: sprite旋转分析数据
+        method: 匹配背景块方法
+        stats: 可选字典，传入时写入匹配统计信息（evaluations: 模板匹配次数）
+        candidates: 可选字典，传入时写入所有可能的匹配，用于之后计算次优匹配
+
+    返回:
+        匹配结果列表，每个元素是一个字典包含匹配信息
+    """
+    # 第一阶段：收集所有可能的匹配
+    all_matches, evaluations = collect_matches(bg_black_regions, preprocessed_bg, rotation_data, method)
+
+    if stats is not None:
+        stats['evaluations'] = evaluations
+
+    if candidates is not None:
+        save_candidates(candidates, all_matches, len(rotation_data), len(bg_black_regions))
+
+    # 第二阶段：解决冲突，选择最佳匹配
+    return resolve_matches(all_matches, len(rotation_data), len(bg_black_regions), is_exclusive_method(method))
 
 
 def display_matches_on_background(original_bg, matches):
@@ -734,26 +1080,221 @@ def preprocess_mask(img, scale_factor: int | float = 4, kernel_size=2, iteration
     return img
 
 
-def main(bg_data, sprite_data, match_method='template', show_results=False, show_preprocessed=False):
-    # 加载原始背景图像
-    original_bg = load_image(bg_data)
+# 背景和sprite中视为黑色的BGR阈值
+BG_THRESHOLD = 25
+SPRITE_THRESHOLD = 30
+# 背景掩码降采样倍数
+BG_DOWNSCALE = 4
+# 膨胀核
+DILATE_KERNEL = np.ones((2, 2), np.uint8)
 
-    # 加载Sprite图像
-    original_sprite = load_image(sprite_data)
+# 预处理使用的缓冲区，每个线程独立
+_buffers = threading.local()
 
-    height, width = original_sprite.shape[:2]
-    original_sprite = cv2.resize(
-        original_sprite,
-        (int(width * 1.55), int(height * 1.55)),
-        interpolation=cv2.INTER_NEAREST
-    )
 
-    # 预处理图像
-    bg_mask = load_and_preprocess(original_bg, 25)
-    sprite_mask = load_and_preprocess(original_sprite)
+def get_buffer(name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+    """获取当前线程中可复用的缓冲区，形状或类型不同时重新分配"""
+    buffers = getattr(_buffers, 'buffers', None)
+    if buffers is None:
+        buffers = _buffers.buffers = {}
+
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = buffers[name] = np.empty(shape, dtype)
+    return buffer
+
+
+def preprocess_background(bg_img, debug=None):
+    """
+    背景预处理，结果与 preprocess_mask(load_and_preprocess(bg_img, 25)) 相同
+
+    提取黑色、膨胀、区域平均降采样、二值化、最近邻放大依次写入当前线程的缓冲区，不为每一步分配新数组
+
+    参数:
+        bg_img: 背景图像
+        debug: 可选字典，传入时写入各中间掩码的副本
+
+    返回:
+        (全分辨率掩码, 降采样后的掩码)，均为当前线程的缓冲区，同一线程下次调用时会被覆盖
+    """
+    height, width = bg_img.shape[:2]
+
+    black = get_buffer('bg_black', (height, width))
+    cv2.inRange(bg_img, (0, 0, 0), (BG_THRESHOLD, BG_THRESHOLD, BG_THRESHOLD), dst=black)
+    if debug is not None:
+        debug['bg_black'] = black.copy()
+
+    cv2.dilate(black, DILATE_KERNEL, dst=black)
+
+    low_size = (int(width // BG_DOWNSCALE), int(height // BG_DOWNSCALE))
+    low = get_buffer('bg_low', (low_size[1], low_size[0]))
+    cv2.resize(black, low_size, dst=low, interpolation=cv2.INTER_AREA)
+    cv2.threshold(low, 127, 255, cv2.THRESH_BINARY, dst=low)
+
+    mask = get_buffer('bg_mask', (height, width))
+    cv2.resize(low, (width, height), dst=mask, interpolation=cv2.INTER_NEAREST)
+
+    if debug is not None:
+        debug['bg_low'] = low.copy()
+        debug['bg_mask'] = mask.copy()
+
+    return mask, low
+
+
+def extract_background_regions(bg_mask, bg_low):
+    """
+    提取背景中的黑色区域并合并（选取最大的10个）
+
+    尺寸能被降采样倍数整除时，全分辨率掩码中每个像素块都是降采样掩码中的一个像素，
+    直接在降采样掩码上寻找轮廓再放大矩形，结果相同
+    """
+    height, width = bg_mask.shape[:2]
+    if height % BG_DOWNSCALE == 0 and width % BG_DOWNSCALE == 0:
+        return extract_black_regions(bg_low, 50, merge_distance=5, scale=BG_DOWNSCALE)[:10]
+    return extract_black_regions(bg_mask, 50, merge_distance=5)[:10]
+
+
+def preprocess_sprite(sprite_img, debug=None):
+    """
+    sprite预处理，结果与 preprocess_mask(load_and_preprocess(放大 1.55 倍的 sprite_img), 1) 相同
+
+    提取黑色是逐像素操作，与最近邻放大可以交换顺序，因此先在较小的原图上提取黑色再放大；
+    preprocess_mask 在缩放倍数为 1 时的缩放和二值化不改变掩码，只需膨胀
+
+    返回:
+        放大后的掩码，为当前线程的缓冲区，同一线程下次调用时会被覆盖
+    """
+    height, width = sprite_img.shape[:2]
+
+    black = get_buffer('sprite_black', (height, width))
+    cv2.inRange(sprite_img, (0, 0, 0), (SPRITE_THRESHOLD, SPRITE_THRESHOLD, SPRITE_THRESHOLD), dst=black)
+
+    size = (int(width * SPRITE_SCALE), int(height * SPRITE_SCALE))
+    mask = get_buffer('sprite_mask', (size[1], size[0]))
+    cv2.resize(black, size, dst=mask, interpolation=cv2.INTER_NEAREST)
+    if debug is not None:
+        debug['sprite_black'] = mask.copy()
+
+    cv2.dilate(mask, DILATE_KERNEL, dst=mask)
+    if debug is not None:
+        debug['sprite_mask'] = mask.copy()
+
+    return mask
+
+
+def cache_key(kind, image_data):
+    """二进制图片数据的缓存键，其他输入（路径、数组等）不缓存，返回 None"""
+    if isinstance(image_data, (bytes, bytearray)):
+        return kind, content_key(image_data)
+    return None
+
+
+def load_checked_image(image_data):
+    img = load_image(image_data)
+    if img is None:
+        raise ValueError("图像加载失败，请检查输入数据是否正确")
+    return img
+
+
+def prepare_background(bg_data, debug=None, timings=NULL_TIMINGS):
+    """
+    加载并预处理背景图像，提取黑色区域
+
+    二进制数据按内容哈希缓存，同一张图片再次识别时不需要重新解码和预处理；需要调试中间结果时不使用缓存
 
-    bg_mask = preprocess_mask(bg_mask)
-    sprite_mask = preprocess_mask(sprite_mask, 1)
+    返回:
+        字典，包含 image（解码后的图像）、mask（全分辨率掩码）、low（降采样掩码）、regions（黑色区域）
+    """
+    key = cache_key('bg', bg_data) if debug is None else None
+    if key is not None:
+        cached = image_cache.get(key)
+        if cached is not None:
+            return cached
+
+    with timings.span('decode_bg'):
+        image = load_checked_image(bg_data)
+    with timings.span('preprocess_bg'):
+        mask, low = preprocess_background(image, debug)
+    with timings.span('regions_bg'):
+        regions = extract_background_regions(mask, low)
+    background = {
+        'image': image,
+        'mask': mask,
+        'low': low,
+        'regions': regions
+    }
+
+    if key is not None:
+        # 掩码是当前线程的缓冲区，缓存只读副本
+        background.update(image=freeze(image), mask=freeze(mask), low=freeze(low))
+        image_cache.put(key, background)
+    return background
+
+
+def prepare_sprite(sprite_data, debug=None, timings=NULL_TIMINGS):
+    """
+    加载并预处理sprite图像，提取黑色区域，缓存方式与 prepare_background 相同
+
+    返回:
+        字典，包含 key（缓存键）、image（解码后的图像）、mask（放大后的掩码）、regions（黑色区域），
+        计算过旋转分析后还包含 rotation_data
+    """
+    key = cache_key('sprite', sprite_data) if debug is None else None
+    if key is not None:
+        cached = image_cache.get(key)
+        if cached is not None:
+            return cached
+
+    with timings.span('decode_sprite'):
+        image = load_checked_image(sprite_data)
+    with timings.span('preprocess_sprite'):
+        mask = preprocess_sprite(image, debug)
+    with timings.span('regions_sprite'):
+        regions = extract_black_regions(mask, sort_mode="position-l")
+    sprite = {
+        'key': key,
+        'image': image,
+        'mask': mask,
+        'regions': regions
+    }
+
+    if key is not None:
+        sprite.update(image=freeze(image), mask=freeze(mask))
+        image_cache.put(key, sprite)
+    return sprite
+
+
+def sprite_rotation_data(sprite):
+    """获取sprite的旋转分析数据，第一次计算后与sprite一起缓存"""
+    rotation_data = sprite.get('rotation_data')
+    if rotation_data is None:
+        rotation_data = analyze_rotated_regions(sprite['mask'], sprite['regions'])
+        if sprite['key'] is not None:
+            image_cache.put(sprite['key'], dict(sprite, rotation_data=rotation_data))
+    return rotation_data
+
+
+def main(bg_data, sprite_data, match_method='template', show_results=False, show_preprocessed=False, stats=None,
+         workers=None, candidates=None, debug=None, timings=NULL_TIMINGS):
+    """
+    识别验证码，返回按 sprite_idx 排序的匹配列表
+
+    参数:
+        debug: 可选字典，传入时写入预处理各阶段中间掩码的副本（bg_black、bg_low、bg_mask、sprite_black、sprite_mask）
+        timings: 记录各阶段耗时（解码、预处理、提取区域、旋转分析、匹配），图片已缓存时没有解码至提取区域的耗时
+    """
+    start_time = time.perf_counter()
+
+    # 加载并预处理图像，提取背景和Sprite图像中的黑色区域
+    background = prepare_background(bg_data, debug, timings)
+    sprite = prepare_sprite(sprite_data, debug, timings)
+
+    original_bg = background['image']
+    original_sprite = sprite['image']
+    bg_mask = background['mask']
+    sprite_mask = sprite['mask']
+    bg_black_regions = background['regions']
+    sprite_black_regions = sprite['regions']
 
     # 如果需要显示预处理结果
     if show_preprocessed:
@@ -772,35 +1313,64 @@ def main(bg_data, sprite_data, match_method='template', show_results=False, show
         plt.tight_layout()
         plt.show()
 
-    # 提取背景图像中的黑色区域并合并重叠的（选取最大的10个）
-    bg_black_regions = extract_black_regions(bg_mask, 50, merge_distance=5)[:10]
-    # 提取Sprite图像中的黑色区域
-    sprite_black_regions = extract_black_regions(sprite_mask, sort_mode="position-l")
-
-    # 分析旋转后的sprite区域
-    rotation_data = analyze_rotated_regions(sprite_mask, sprite_black_regions)
+    if show_results or show_preprocessed:
+        # 只有显示结果时才需要放大后的sprite原图
+        height, width = original_sprite.shape[:2]
+        original_sprite = cv2.resize(
+            original_sprite,
+            (int(width * SPRITE_SCALE), int(height * SPRITE_SCALE)),
+            interpolation=cv2.INTER_NEAREST
+        )
 
     if show_preprocessed:
         display_black_regions(original_bg, bg_black_regions)
         display_black_regions(original_sprite, sprite_black_regions)
 
-        display_rotation_analysis(rotation_data, original_sprite)
+    if workers and workers > 1:
+        # 使用进程池并行完成每个sprite区域的旋转分析和匹配，再统一解决冲突
+        from src.icr_pool import parallel_collect_matches
+
+        with timings.span('match'):
+            all_matches, evaluations = parallel_collect_matches(
+                bg_black_regions, bg_mask, sprite_mask, sprite_black_regions, match_method, workers
+            )
+        if stats is not None:
+            stats['evaluations'] = evaluations
+        if candidates is not None:
+            save_candidates(candidates, all_matches, len(sprite_black_regions), len(bg_black_regions))
+        matches = resolve_matches(
+            all_matches, len(sprite_black_regions), len(bg_black_regions), is_exclusive_method(match_method)
+        )
+    else:
+        # 分析旋转后的sprite区域
+        with timings.span('rotation'):
+            rotation_data = sprite_rotation_data(sprite)
 
-    # 匹配sprite到背景区域
-    matches = match_sprite_to_background(bg_black_regions, bg_mask, rotation_data, match_method)
+        if show_preprocessed:
+            display_rotation_analysis(rotation_data, original_sprite)
+
+        # 匹配sprite到背景区域
+        with timings.span('match'):
+            matches = match_sprite_to_background(
+                bg_black_regions, bg_mask, rotation_data, match_method, stats, candidates
+            )
+
+    ICR_SOLVE_SECONDS.observe(time.perf_counter() - start_time, method=match_method)
 
     # 显示匹配结果
     if show_results:
         display_matches_on_background(original_bg, matches)
         display_match_comparisons(original_bg, original_sprite, matches)
 
-    for match in matches:
-        if 'sprite_rect' in match:
-            original_tuple = match['sprite_rect']
-            scaled_tuple = tuple(int(x // 1.55) for x in original_tuple)
-            match['sprite_rect'] = scaled_tuple
+    return [scale_sprite_rect(match) for match in matches]
 
-    return matches
+
+def scale_sprite_rect(match):
+    """返回 sprite_rect 换算回原始sprite图像坐标的匹配副本，不修改所有匹配中共享的字典"""
+    match = match.copy()
+    if 'sprite_rect' in match:
+        match['sprite_rect'] = tuple(int(x // SPRITE_SCALE) for x in match['sprite_rect'])
+    return match
 
 
 def convert_matches_to_positions(matches):
@@ -811,13 +1381,64 @@ def convert_matches_to_positions(matches):
     return positions
 
 
-def find_part_positions(bg_img, sprite_img, match_method='template'):
-    """在图像中查找所有sprite部分的位置，返回中心点坐标列表"""
+def find_part_positions(bg_img, sprite_img, match_method='template', workers=None, timings=NULL_TIMINGS):
+    """在图像中查找所有sprite部分的位置，返回中心点坐标列表，workers 大于 1 时使用进程池并行匹配"""
     return convert_matches_to_positions(
-        main(bg_img, sprite_img, match_method, False, False)
+        main(bg_img, sprite_img, match_method, False, False, workers=workers, timings=timings)
     )
 
 
+def find_part_solutions(bg_img, sprite_img, match_method='template', workers=None, top_k=3, timings=NULL_TIMINGS):
+    """
+    求总相似度最高的前 top_k 个全局一致的匹配方案，校验失败时可以依次尝试，不需要重新匹配
+
+    返回:
+        [{'score': 总相似度, 'positions': 中心点坐标列表, 'matches': 匹配列表}, ...]
+    """
+    candidates = {}
+    main(bg_img, sprite_img, match_method, False, False, workers=workers, candidates=candidates, timings=timings)
+    if not candidates:
+        return []
+
+    with timings.span('rank'):
+        solutions = rank_matches(
+            candidates['all_matches'], candidates['sprite_count'], candidates['bg_count'], top_k
+        )
+    return [
+        {
+            'score': solution['score'],
+            'positions': convert_matches_to_positions(solution['matches']),
+            'matches': [scale_sprite_rect(match) for match in solution['matches']]
+        }
+        for solution in solutions
+    ]
+
+
+def find_part_candidates(bg_img, sprite_img, match_method='template', workers=None, timings=NULL_TIMINGS):
+    """
+    与 find_part_positions 相同，同时返回计算次优位置的函数
+
+    次优位置由本次收集的所有匹配重新解决冲突得到，不需要重新匹配，用于校验失败后在同一组图片上重试
+
+    返回:
+        (中心点坐标列表, 返回次优中心点坐标列表的函数，没有其他完整匹配时该函数返回 None)
+    """
+    candidates = {}
+    matches = main(bg_img, sprite_img, match_method, False, False, workers=workers, candidates=candidates,
+                   timings=timings)
+
+    def alternative():
+        if not candidates:
+            return None
+        alternative_matches = resolve_alternative_matches(
+            candidates['all_matches'], matches,
+            candidates['sprite_count'], candidates['bg_count']
+        )
+        return convert_matches_to_positions(alternative_matches) if alternative_matches else None
+
+    return convert_matches_to_positions(matches), alternative
+
+
 if __name__ == "__main__":
     # 使用示例图片路径
     bg = "tests/bg.jpg"
@@ -0,0 +1,159 @@
+import heapq
+from itertools import count
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+# 禁止的匹配在代价矩阵中使用的代价，远大于相似度（0-100）之和
+FORBIDDEN_COST = 1e9
+
+Assignment = Tuple[int, ...]
+
+
+def hungarian(cost: Sequence[Sequence[float]]) -> List[int]:
+    """
+    匈牙利算法，求代价最小的分配（每行分配不同的列）
+
+    参数:
+        cost: n x m 代价矩阵，要求 n <= m
+
+    返回:
+        每一行分配到的列序号
+    """
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    inf = float('inf')
+
+    # 行、列势能，p[j] 为分配到第 j 列的行（下标从 1 开始，0 表示未分配）
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        min_v = [inf] * (m + 1)
+        used = [False] * (m + 1)
+
+        # 寻找增广路径
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            delta = inf
+            j1 = 0
+            row = cost[i0 - 1]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u[i0] - v[j]
+                    if cur < min_v[j]:
+                        min_v[j] = cur
+                        way[j] = j0
+                    if min_v[j] < delta:
+                        delta = min_v[j]
+                        j1 = j
+
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_v[j] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+
+        # 沿增广路径更新分配
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    result = [-1] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            result[p[j] - 1] = j - 1
+    return result
+
+
+def _is_allowed(scores, i, j, forced: Dict[int, int], forbidden: Set[Tuple[int, int]], exclusive: bool) -> bool:
+    if scores[i][j] is None or (i, j) in forbidden:
+        return False
+    if i in forced:
+        return forced[i] == j
+    # 每列只能分配一行时，已被其他行固定的列不可用
+    return not (exclusive and j in forced.values())
+
+
+def _solve(scores, forced: Dict[int, int], forbidden: Set[Tuple[int, int]], exclusive: bool) \
+        -> Optional[Tuple[float, Assignment]]:
+    """在固定和禁止的约束下求总分最高的分配，不存在完整分配时返回 None"""
+    n = len(scores)
+    m = len(scores[0])
+
+    if not exclusive:
+        # 每行独立选择分数最高的列
+        assignment = []
+        for i in range(n):
+            allowed = [j for j in range(m) if _is_allowed(scores, i, j, forced, forbidden, exclusive)]
+            if not allowed:
+                return None
+            assignment.append(max(allowed, key=lambda j: scores[i][j]))
+    else:
+        cost = [
+            [-scores[i][j] if _is_allowed(scores, i, j, forced, forbidden, exclusive) else FORBIDDEN_COST
+             for j in range(m)]
+            for i in range(n)
+        ]
+        assignment = hungarian(cost)
+        if any(cost[i][j] >= FORBIDDEN_COST for i, j in enumerate(assignment)):
+            return None
+
+    return sum(scores[i][j] for i, j in enumerate(assignment)), tuple(assignment)
+
+
+def ranked_assignments(scores: Sequence[Sequence[Optional[float]]], k: int, exclusive: bool = True) \
+        -> List[Tuple[float, Assignment]]:
+    """
+    按总分从高到低求前 k 个完整分配（Murty 算法）
+
+    参数:
+        scores: n x m 分数矩阵，None 表示该行不能分配到该列
+        k: 最多返回的分配数量
+        exclusive: 每列是否只能分配给一行，为 False 时每行独立选择
+
+    返回:
+        [(总分, 每一行分配到的列序号), ...]，没有完整分配时返回空列表
+    """
+    n = len(scores)
+    if k <= 0 or n == 0 or not len(scores[0]):
+        return []
+    if exclusive and n > len(scores[0]):
+        return []
+
+    first = _solve(scores, {}, set(), exclusive)
+    if first is None:
+        return []
+
+    # (-总分, 序号, 分配, 固定的分配, 禁止的分配)
+    tie = count()
+    heap = [(-first[0], next(tie), first[1], {}, frozenset())]
+    results = []
+
+    while heap and len(results) < k:
+        negative_score, _, assignment, forced, forbidden = heapq.heappop(heap)
+        results.append((-negative_score, assignment))
+
+        # 将剩余解空间划分为互不相交的子问题：固定前面的分配，禁止当前的分配
+        sub_forced = dict(forced)
+        for i, j in enumerate(assignment):
+            if i in forced:
+                continue
+
+            sub_forbidden = forbidden | {(i, j)}
+            solution = _solve(scores, sub_forced, sub_forbidden, exclusive)
+            if solution is not None:
+                heapq.heappush(heap, (-solution[0], next(tie), solution[1], sub_forced.copy(), sub_forbidden))
+
+            sub_forced[i] = j
+
+    return results
@@ -1,8 +1,13 @@
 import json
-from typing import Dict, Union
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple, Union
 
 import requests
 
+from src.endpoints import DEFAULT_ENDPOINTS, get_endpoints
+from src.http_client import HttpClient, get_http_client
 from src.utils import json_stringify
 
 
@@ -27,6 +32,46 @@ def load_header_auth(auth, headers: Dict[str, str] = None, boolean: bool = False
     return False if boolean else headers
 
 
+# CSRF 令牌缓存的有效期（秒）
+CSRF_TOKEN_TTL = 600
+
+# rain-session -> (CSRF 令牌, 过期时间)，在多次请求之间复用，网页模式下避免每个请求都重新获取
+_csrf_cache: Dict[str, Tuple[str, float]] = {}
+_csrf_lock = threading.Lock()
+
+
+def get_cached_csrf_token(auth) -> Optional[str]:
+    """获取未过期的缓存 CSRF 令牌"""
+    session = auth.get('rain-session')
+    if not session:
+        return None
+
+    with _csrf_lock:
+        item = _csrf_cache.get(session)
+        if item is None:
+            return None
+        if item[1] <= time.monotonic():
+            del _csrf_cache[session]
+            return None
+        return item[0]
+
+
+def cache_csrf_token(auth, token: str):
+    """缓存 CSRF 令牌"""
+    session = auth.get('rain-session')
+    if session:
+        with _csrf_lock:
+            _csrf_cache[session] = (token, time.monotonic() + CSRF_TOKEN_TTL)
+
+
+def invalidate_csrf_token(auth):
+    """使缓存的 CSRF 令牌失效，在请求返回 401/403 时调用"""
+    session = auth.get('rain-session')
+    if session:
+        with _csrf_lock:
+            _csrf_cache.pop(session, None)
+
+
 def load_cookies_auth(auth) -> Dict[str, str]:
     """加载cookie认证信息"""
     if load_header_auth(auth, {}, True):
@@ -35,11 +80,16 @@ def load_cookies_auth(auth) -> Dict[str, str]:
 
 
 class AuthInfo:
-    def __init__(self, name=None, headers=None, cookies=None, update_cookies=None, error=None):
+    def __init__(self, name=None, headers=None, cookies=None, update_cookies=None, error=None, http=None,
+                 api_base_url=None):
         self.name = name
         self.headers = headers
         self.cookies = cookies
         self.update_cookies = update_cookies
+        # 发送该认证请求所用的 HTTP 客户端
+        self.http: HttpClient = http or get_http_client()
+        # 雨云接口地址
+        self.api_base_url = api_base_url or DEFAULT_ENDPOINTS['api']
 
         self.error = error
 
@@ -48,20 +98,25 @@ class AuthInfo:
 
 
 class AuthProcess:
-    def __init__(self, config, headers):
+    def __init__(self, config, headers, http: HttpClient = None):
         auth = config.get('auth', {}).copy()
         self.multi = isinstance(auth, list)
         self.common_headers = headers
         self.config = config
         self.auth_list = auth if self.multi else [auth]
+        self.http = http or get_http_client(config.get('http'))
+        self.api_base_url = get_endpoints(config)['api']
+        # 多个账号并发请求时，更新cookie并保存配置需要互斥
+        self._cookies_lock = threading.Lock()
 
     def update_cookies_from_response(self, auth, response, current_cookies: Dict[str, str]) -> Dict[str, str]:
         """从响应中更新cookie"""
         if 'set-cookie' in response.headers:
             new_cookies = current_cookies.copy()
             new_cookies.update(response.cookies.get_dict())
-            auth.update(new_cookies)
-            self.config.save_auth(self.auth_list if self.multi else self.auth_list[0])
+            with self._cookies_lock:
+                auth.update(new_cookies)
+                self.config.save_auth(self.auth_list if self.multi else self.auth_list[0])
             return new_cookies
         return current_cookies
 
@@ -69,12 +124,15 @@ class AuthProcess:
     def get_csrf_token(self, auth):
         cookies = load_cookies_auth(auth)
 
+        cached_token = get_cached_csrf_token(auth)
+        if cached_token:
+            return cached_token, cookies
+
         try:
-            response = requests.get(
-                "https://api.v2.rainyun.com/user/csrf",
+            response = self.http.get(
+                f"{self.api_base_url}/user/csrf",
                 headers=load_header_auth(auth, self.common_headers),
-                cookies=cookies,
-                timeout=10
+                cookies=cookies
             )
             cookies = self.update_cookies_from_response(auth, response, cookies)
 
@@ -94,6 +152,7 @@ class AuthProcess:
                 }, cookies
 
             if 'data' in result and isinstance(result['data'], str):
+                cache_csrf_token(auth, result['data'])
                 return result.get('data'), cookies
 
             return {
@@ -102,28 +161,50 @@ class AuthProcess:
         except (requests.exceptions.HTTPError, requests.exceptions.RequestException, json.decoder.JSONDecodeError) as e:
             return {"error": f"获取 CSRF 令牌错误：{str(e)}"}, cookies
 
-    def enumerate(self):
-        enum = []
-        for i, auth in enumerate(self.auth_list):
-            auth_name = str(auth.get('name', ''))
-            auth_display_name = f"{auth_name if auth_name else f'认证配置'}({i + 1})"
+    def get_auth_info(self, i, auth) -> AuthInfo:
+        """获取单个认证配置的认证信息，使用 cookie 认证时获取 CSRF 令牌"""
+        auth_name = str(auth.get('name', ''))
+        auth_display_name = f"{auth_name if auth_name else f'认证配置'}({i + 1})"
 
-            use_api_key = load_header_auth(auth, boolean=True)
-            cookies = {}
-            csrf_token = None
+        use_api_key = load_header_auth(auth, boolean=True)
+        cookies = {}
+        csrf_token = None
 
-            if not use_api_key:
-                csrf_token, cookies = self.get_csrf_token(auth)
+        if not use_api_key:
+            csrf_token, cookies = self.get_csrf_token(auth)
 
-                if not isinstance(csrf_token, str):
-                    enum.append(AuthInfo(name=auth_display_name, error=csrf_token))
-                    continue
+            if not isinstance(csrf_token, str):
+                return AuthInfo(name=auth_display_name, error=csrf_token, http=self.http,
+                                api_base_url=self.api_base_url)
 
-            headers = load_header_auth(auth, self.common_headers, csrf_token=csrf_token)
+        headers = load_header_auth(auth, self.common_headers, csrf_token=csrf_token)
 
-            def update_cookies(res):
-                self.update_cookies_from_response(auth, res, cookies)
+        def update_cookies(res):
+            # 认证失败时令牌可能已失效，下次重新获取
+            if res.status_code in (401, 403):
+                invalidate_csrf_token(auth)
+            self.update_cookies_from_response(auth, res, cookies)
 
-            enum.append(AuthInfo(auth_display_name, headers, cookies, update_cookies))
+        return AuthInfo(auth_display_name, headers, cookies, update_cookies, http=self.http,
+                        api_base_url=self.api_base_url)
 
-        return enum
+    def enumerate(self, prefetch: int = 0) -> Iterator[AuthInfo]:
+        """
+        按配置顺序逐个生成认证信息
+
+        参数:
+            prefetch: 同时获取 CSRF 令牌的数量，大于 1 时在后台并发获取，前面的账号获取完成即可开始处理；
+                      否则在迭代到某个账号时才获取
+        """
+        if prefetch <= 1 or len(self.auth_list) <= 1:
+            for i, auth in enumerate(self.auth_list):
+                yield self.get_auth_info(i, auth)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(prefetch, len(self.auth_list)), thread_name_prefix='csrf')
+        try:
+            futures = [executor.submit(self.get_auth_info, i, auth) for i, auth in enumerate(self.auth_list)]
+            for future in futures:
+                yield future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+# 默认的预取设置，可在配置文件的 captcha_prefetch 字段中覆盖
+DEFAULT_PREFETCH_OPTIONS = {
+    'size': 0,  # 保持就绪的验证码数量，0 为不预取
+    'ttl': 60.0  # 预取的验证码有效期（秒），超过后丢弃
+}
+
+# 获取失败后等待多久再重试（秒）
+RETRY_DELAY = 5.0
+# 相邻两次获取开始的最短间隔（秒），避免验证码过期过快时不停请求验证码接口
+MIN_FETCH_INTERVAL = 1.0
+# 最多同时存在的预取队列数量（不同配置文件、验证码 aid）
+MAX_PREFETCHERS = 8
+
+
+def normalize_prefetch_options(options: Any) -> Dict[str, Any]:
+    """合并默认设置，忽略无效的值"""
+    result = DEFAULT_PREFETCH_OPTIONS.copy()
+    if isinstance(options, int) and not isinstance(options, bool):
+        options = {'size': options}
+    if not isinstance(options, dict):
+        return result
+
+    for key, default in DEFAULT_PREFETCH_OPTIONS.items():
+        value = options.get(key, default)
+        # size 为 0 表示不预取，ttl 必须为正数，否则验证码一放入队列就过期
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0 or \
+                (key == 'ttl' and value == 0):
+            print(f"警告: 忽略无效的 captcha_prefetch 配置 '{key}': {value}")
+            continue
+        result[key] = type(default)(value)
+
+    return result
+
+
+class CaptchaPrefetcher:
+    """
+    验证码预取队列
+
+    在后台线程中持续获取验证码（验证码数据、图片、collect/eks 和 PoW 答案），保持最多 size 个就绪的验证码，
+    签到时直接取出一个，只需进行识别和校验。超过 ttl 秒的验证码会被丢弃并重新获取
+    """
+
+    def __init__(self, fetch: Callable[[], Any], size: int = 2, ttl: float = 60.0):
+        """
+        参数:
+            fetch: 获取一个验证码的函数
+            size: 保持就绪的验证码数量
+            ttl: 验证码有效期（秒）
+        """
+        self.fetch = fetch
+        self.size = max(1, size)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        # (过期时间, 验证码)
+        self._ready = deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='captcha-prefetch', daemon=True)
+        self._thread.start()
+
+    def _discard_expired(self):
+        now = time.monotonic()
+        while self._ready and self._ready[0][0] <= now:
+            self._ready.popleft()
+
+    def _run(self):
+        next_fetch = 0.0
+        while True:
+            with self._condition:
+                # 限制获取频率
+                self._condition.wait_for(lambda: self._stopped, max(0.0, next_fetch - time.monotonic()))
+                while not self._stopped:
+                    self._discard_expired()
+                    if len(self._ready) < self.size:
+                        break
+                    # 队列已满，等待取出或最早的验证码过期
+                    self._condition.wait(self._ready[0][0] - time.monotonic())
+                if self._stopped:
+                    return
+
+            next_fetch = time.monotonic() + MIN_FETCH_INTERVAL
+            try:
+                session = self.fetch()
+            except Exception as e:
+                print(f"警告: 预取验证码失败: {e}")
+                with self._condition:
+                    self._condition.wait_for(lambda: self._stopped, RETRY_DELAY)
+                continue
+
+            with self._condition:
+                self._ready.append((time.monotonic() + self.ttl, session))
+
+    def pop(self) -> Optional[Any]:
+        """取出一个就绪的验证码，没有时返回 None"""
+        with self._condition:
+            self._discard_expired()
+            if not self._ready:
+                self.misses += 1
+                return None
+            _, session = self._ready.popleft()
+            self.hits += 1
+            # 唤醒后台线程补充
+            self._condition.notify_all()
+            return session
+
+    def ready_count(self) -> int:
+        with self._condition:
+            self._discard_expired()
+            return len(self._ready)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._ready.clear()
+            self._condition.notify_all()
+
+
+_prefetchers: Dict[tuple, CaptchaPrefetcher] = {}
+_prefetchers_lock = threading.Lock()
+
+
+def get_captcha_prefetcher(key: tuple, fetch: Callable[[], Any], options: Any = None) \
+        -> Optional[CaptchaPrefetcher]:
+    """
+    获取共享的验证码预取队列，未开启预取或队列数量已达上限时返回 None
+
+    参数:
+        key: 区分预取队列的键（配置文件路径、验证码配置等），相同的键共用同一个队列
+        fetch: 第一次创建队列时使用的获取函数
+        options: 配置文件中的 captcha_prefetch 设置
+    """
+    options = normalize_prefetch_options(options)
+    if options['size'] <= 0:
+        return None
+
+    key = key + tuple(sorted(options.items()))
+    with _prefetchers_lock:
+        prefetcher = _prefetchers.get(key)
+        if prefetcher is None:
+            if len(_prefetchers) >= MAX_PREFETCHERS:
+                return None
+            prefetcher = _prefetchers[key] = CaptchaPrefetcher(fetch, options['size'], options['ttl'])
+        return prefetcher
+
@@ -1,22 +1,207 @@
+import atexit
+import copy
 import os
 import json
+import tempfile
+import threading
 from typing import Dict, Any, Optional, Union
 
+# 配置写入的合并间隔（秒），期间的多次修改只写入一次
+FLUSH_DELAY = 1.0
+
 
 class ConfigError(Exception):
     """自定义配置错误异常"""
     pass
 
 
+def default_file_mode() -> int:
+    """新建文件的默认权限（0644 去掉 umask 屏蔽的位）"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o644 & ~umask
+
+
+def write_json_atomic(path: str, data: Any):
+    """
+    先写入同目录下的临时文件再替换，避免写入中断或并发读取时得到不完整的文件
+
+    路径是符号链接时替换链接指向的文件，并保留原文件的权限（mkstemp 创建的临时文件权限为 0600）
+    """
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = default_file_mode()
+
+    fd, temp_path = tempfile.mkstemp(prefix='.config-', suffix='.tmp', dir=directory)
+    try:
+        os.chmod(temp_path, mode)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ConfigWriter:
+    """
+    延迟合并写入配置文件
+
+    每次修改只记录待写入的内容，在 FLUSH_DELAY 秒后或程序退出时统一写入一次，
+    大量请求同时更新 cookie 时不会反复读写配置文件。读取配置文件时将待写入的内容覆盖在读取结果上，不需要先写入
+    """
+
+    def __init__(self, delay: float = FLUSH_DELAY):
+        self.delay = delay
+        # 路径 -> {'config': 整个配置或 None, 'auth': 只更新的 auth 部分}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+        self._lock = threading.Lock()
+        # 同一时间只写入一次文件，避免“读取现有配置再写入”交错
+        self._write_lock = threading.Lock()
+
+    def schedule(self, path: str, config: Optional[Dict[str, Any]] = None, auth: Any = None):
+        """
+        记录待写入的内容
+
+        参数:
+            path: 配置文件路径
+            config: 要写入的整个配置
+            auth: 只更新配置文件中的 auth 部分
+        """
+        path = os.path.abspath(path)
+        # 记录副本，之后对配置的修改不会影响写入内容
+        config = copy.deepcopy(config)
+        auth = copy.deepcopy(auth)
+
+        with self._lock:
+            pending = self._pending.setdefault(path, {'config': None, 'auth': None})
+            if config is not None:
+                pending['config'] = config
+                pending['auth'] = None
+            elif pending['config'] is not None:
+                pending['config']['auth'] = auth
+            else:
+                pending['auth'] = auth
+
+            if path not in self._timers:
+                timer = threading.Timer(self.delay, self._flush_timer, (path,))
+                timer.daemon = True
+                self._timers[path] = timer
+                timer.start()
+
+    def pending(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        指定路径待写入的内容
+
+        返回:
+            {'config': 整个配置或 None, 'auth': 只更新的 auth 部分} 的副本，没有待写入的内容时返回 None
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            pending = self._pending.get(path)
+            return copy.deepcopy(pending) if pending is not None else None
+
+    def _flush_timer(self, path: str):
+        try:
+            self.flush(path)
+        except ConfigError as e:
+            print(f"警告: {e}")
+
+    def flush(self, path: str):
+        """立即写入指定路径待写入的内容"""
+        path = os.path.abspath(path)
+
+        with self._write_lock:
+            with self._lock:
+                pending = self._pending.pop(path, None)
+                timer = self._timers.pop(path, None)
+            if timer is not None:
+                timer.cancel()
+            if pending is None:
+                return
+
+            try:
+                if pending['config'] is not None:
+                    data = pending['config']
+                else:
+                    # 只更新 auth 部分，保留配置文件中的其他内容
+                    data = {}
+                    if os.path.exists(path):
+                        with open(path, 'r', encoding='utf-8') as f:
+                            data = json.load(f)
+                    data["auth"] = pending['auth']
+
+                write_json_atomic(path, data)
+            except Exception as e:
+                raise ConfigError(f"无法保存 {path} 文件 - {str(e)}")
+
+    def flush_all(self):
+        """写入所有待写入的内容，程序退出时调用"""
+        with self._lock:
+            paths = list(self._pending)
+        for path in paths:
+            try:
+                self.flush(path)
+            except ConfigError as e:
+                print(f"警告: {e}")
+
+
+config_writer = ConfigWriter()
+atexit.register(config_writer.flush_all)
+
+# 路径 -> (文件标识, 解析后的配置)，文件未变化时不再重新读取和解析
+_file_cache: Dict[str, tuple] = {}
+_file_cache_lock = threading.Lock()
+# 已通过验证的配置文件 auth 部分 (路径, 文件标识)，文件未变化时不再重复验证
+_validated_auth = set()
+
+
+def load_json_cached(path: str) -> tuple:
+    """
+    读取 JSON 配置文件，按路径缓存解析结果
+
+    以 inode、修改时间和文件大小判断文件是否变化（原子写入会替换文件，inode 一定会变化）。
+
+    返回:
+        ((路径, 文件标识), 解析后的配置)，配置是共享的缓存内容，调用方不能直接修改
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    with _file_cache_lock:
+        cached = _file_cache.get(path)
+    if cached is None or cached[0] != key:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        cached = (key, data)
+        with _file_cache_lock:
+            _file_cache[path] = cached
+
+    return (path, cached[0]), cached[1]
+
+
 class Config:
     def __init__(self, config_path: str | None = "config.json", api_config_data: Optional[Dict[str, Any]] = None):
         self.config_path = config_path
         self.api_config_data = api_config_data
         self.config: Dict[str, Any] = {}
+        # auth 来自未变化的配置文件时为该文件的标识，用于跳过重复验证
+        self._file_auth_key = None
         self._load_config()
 
         # 确保auth配置存在并验证
         if "auth" not in self.config:
+            self._file_auth_key = None
             self.config["auth"] = {
                 "dev-code": "",
                 "rain-session": "",
@@ -31,15 +216,22 @@ class Config:
         """加载配置文件"""
         # 优先使用api_config_data中的配置
         if self.api_config_data is not None:
-            file_config = self._load_file_config() if self.config_path else {}
+            # auth 来自 api_config_data 时不需要复制文件中的 auth
+            copy_auth = "auth" not in self.api_config_data
+            file_config = self._load_file_config(copy_auth) if self.config_path else {}
             self.config = self._deep_merge_configs(file_config, self.api_config_data)
             return
 
         # 如果没有api_config_data，则只使用文件配置
         self.config = self._load_file_config()
 
-    def _load_file_config(self) -> Dict[str, Any]:
-        """从文件加载配置"""
+    def _load_file_config(self, copy_auth: bool = True) -> Dict[str, Any]:
+        """从文件加载配置，文件未变化时使用缓存，尚未写入的修改覆盖在文件内容上"""
+        pending = config_writer.pending(self.config_path)
+        if pending is not None and pending['config'] is not None:
+            # 整个配置尚未写入，直接使用（已是副本）
+            return pending['config']
+
         if not os.path.exists(self.config_path):
             # 创建默认配置文件
             default_config = {
@@ -61,13 +253,27 @@ class Config:
             )
 
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            file_key, cached = load_json_cached(self.config_path)
         except json.JSONDecodeError:
             raise ConfigError(f"{self.config_path} 文件不是有效的 JSON 格式")
         except Exception as e:
             raise ConfigError(f"读取 {self.config_path} 时发生意外错误 - {str(e)}")
 
+        # 缓存内容是共享的：顶层浅拷贝（set 只替换顶层字段），会被原地修改的 auth（更新 cookie）再复制每个认证对象
+        config = dict(cached) if isinstance(cached, dict) else cached
+        if copy_auth and isinstance(config, dict) and "auth" in config:
+            auth = config["auth"]
+            if isinstance(auth, list):
+                config["auth"] = [dict(item) if isinstance(item, dict) else item for item in auth]
+            elif isinstance(auth, dict):
+                config["auth"] = dict(auth)
+            self._file_auth_key = file_key
+        if pending is not None and isinstance(config, dict):
+            # 只有 auth 尚未写入，内容与文件不同，需要重新验证
+            config["auth"] = pending['auth']
+            self._file_auth_key = None
+        return config
+
     def _deep_merge_configs(self, base: Dict[str, Any], override: Dict[str, Any], primary=True) -> Dict[str, Any]:
         """深度合并两个配置字典"""
         result = base.copy()
@@ -91,21 +297,7 @@ class Config:
         if self.api_config_data is not None and "auth" in self.api_config_data:
             return  # 如果auth来自api_config_data，则不保存到文件
 
-        try:
-            # 读取现有配置
-            existing_config = {}
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    existing_config = json.load(f)
-
-            # 只更新auth部分
-            existing_config["auth"] = self.config["auth"]
-
-            # 保存
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(existing_config, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            raise ConfigError(f"无法保存 {self.config_path} 文件 - {str(e)}")
+        config_writer.schedule(self.config_path, auth=self.config["auth"])
 
     def _save_config(self):
         """保存整个配置文件"""
@@ -116,14 +308,13 @@ class Config:
             self._save_auth_only()
             return  # 如果使用api_config_data，则不保存到文件
 
-        try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            raise ConfigError(f"无法保存 {self.config_path} 文件 - {str(e)}")
+        config_writer.schedule(self.config_path, config=self.config)
 
     def _validate_auth(self):
         """验证auth配置是否有效"""
+        if self._file_auth_key is not None and self._file_auth_key in _validated_auth:
+            return
+
         auth_list = self.config.get("auth", {})
 
         multi = True
@@ -158,6 +349,9 @@ class Config:
                     "必须提供有效的 'x-api-key' 或提供有效的 'dev-code' 和 'rain-session'"
                 )
 
+        if self._file_auth_key is not None:
+            _validated_auth.add(self._file_auth_key)
+
     def save_auth(self, auth):
         self.set('auth', auth)
 
@@ -0,0 +1,29 @@
+from typing import Dict
+
+# 雨云接口和验证码接口的地址，可在配置文件的 endpoints 字段中修改（如指向 load_test.py 的模拟服务器）
+DEFAULT_ENDPOINTS = {
+    'api': 'https://api.v2.rainyun.com',
+    'captcha': 'https://turing.captcha.qcloud.com'
+}
+
+
+def get_endpoints(config) -> Dict[str, str]:
+    """从配置中读取接口地址，无效时使用默认值"""
+    result = DEFAULT_ENDPOINTS.copy()
+    endpoints = config.get('endpoints', None)
+    if endpoints is None:
+        return result
+    if not isinstance(endpoints, dict):
+        print(f"警告: 忽略无效的 endpoints 配置: {endpoints}")
+        return result
+
+    for key in DEFAULT_ENDPOINTS:
+        value = endpoints.get(key, None)
+        if value is None:
+            continue
+        if not isinstance(value, str) or not value.startswith(('http://', 'https://')):
+            print(f"警告: 忽略无效的 endpoints 配置 '{key}': {value}")
+            continue
+        result[key] = value.rstrip('/')
+
+    return result
@@ -0,0 +1,164 @@
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.endpoints import DEFAULT_ENDPOINTS
+from src.metrics import UPSTREAM_IN_PROGRESS, UPSTREAM_REQUEST_SECONDS, UPSTREAM_RETRIES
+
+# 默认的连接池和重试设置，可在配置文件的 http 字段中覆盖
+DEFAULT_HTTP_OPTIONS = {
+    'pool_connections': 4,  # 缓存连接池的主机数量
+    'pool_maxsize': 10,  # 每个主机保持的最大连接数
+    'retries': 3,  # 连接错误、GET 请求读取错误和 429/5xx 状态码的重试次数
+    'backoff_factor': 0.5,  # 重试间隔系数，第 n 次重试前等待 backoff_factor * 2^(n-1) 秒
+    'timeout': 10.0,  # 请求超时（秒）
+    'rate_limit': 10.0  # 每个主机每秒最多发起的请求数，避免并发时请求过快，0 为不限制
+}
+
+# 可重试的状态码，只对幂等请求生效
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+# 指标中单独统计的主机（验证码和雨云接口），其他主机（如用户传入的图片地址）统一记为 other，避免标签数量无限增长
+_metric_hosts = {urlsplit(url).netloc for url in DEFAULT_ENDPOINTS.values()}
+_metric_hosts_lock = threading.Lock()
+
+
+def add_metric_hosts(*urls: str):
+    """将配置的接口地址加入指标中单独统计的主机"""
+    with _metric_hosts_lock:
+        _metric_hosts.update(urlsplit(url).netloc for url in urls)
+
+
+def metric_host(host: str) -> str:
+    return host if host in _metric_hosts else 'other'
+
+
+class HostRateLimiter:
+    """按主机限制请求频率，同一主机的请求之间至少间隔 1 / rate 秒"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_time: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str):
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time.get(host, now))
+            self._next_time[host] = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
+
+
+class HttpClient:
+    """
+    共享的 HTTP 客户端
+
+    在多次请求之间复用 requests.Session 的连接池（每个主机保持长连接），统一设置超时和重试。
+    会话本身不保存任何 cookie，认证 cookie 由调用方在每次请求时显式传入，避免多个账号之间串用。
+    多个账号并发时按主机限制请求频率，避免触发验证码和接口的频率限制
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=10, retries=3, backoff_factor=0.5, timeout=10.0,
+                 rate_limit=10.0):
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(rate_limit)
+
+        self.session = requests.Session()
+        # 拒绝所有 cookie 写入会话，响应中的 cookie 仍可通过 response.cookies 读取
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS,
+            # POST（签到、验证码校验）不幂等，只在连接建立失败时重试
+            allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}),
+            raise_on_status=False,
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+        self.rate_limiter.wait(host)
+
+        # 记录请求耗时（包含自动重试，不包含频率限制的等待）和重试次数
+        label = metric_host(host)
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            with UPSTREAM_IN_PROGRESS.track_in_progress(host=label):
+                response = self.session.request(method, url, **kwargs)
+            status = response.status_code
+            retries = getattr(response.raw, 'retries', None)
+            if retries is not None and retries.history:
+                UPSTREAM_RETRIES.inc(len(retries.history), host=label)
+            return response
+        finally:
+            UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - start, host=label, method=method, status=status)
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def normalize_http_options(options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认设置，忽略无效的值"""
+    result = DEFAULT_HTTP_OPTIONS.copy()
+    if not isinstance(options, dict):
+        return result
+
+    for key, default in DEFAULT_HTTP_OPTIONS.items():
+        value = options.get(key, default)
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+        if valid:
+            # 重试次数、重试间隔和频率限制可以为 0，连接池大小至少为 1，超时必须为正数
+            if key in ('retries', 'backoff_factor', 'rate_limit'):
+                valid = value >= 0
+            else:
+                valid = value >= 1 if isinstance(default, int) else value > 0
+        if not valid:
+            print(f"警告: 忽略无效的 http 配置 '{key}': {value}")
+            continue
+        result[key] = type(default)(value)
+
+    return result
+
+
+_clients: Dict[tuple, HttpClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_client(options: Optional[Dict[str, Any]] = None) -> HttpClient:
+    """获取共享的 HTTP 客户端，相同设置共用同一个客户端和连接池"""
+    options = normalize_http_options(options)
+    key = tuple(sorted(options.items()))
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = HttpClient(**options)
+        return client
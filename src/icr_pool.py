@@ -0,0 +1,128 @@
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.ICR import analyze_rotated_regions, collect_matches
+
+# 常驻进程池，在多次识别之间复用，避免每次识别都重新启动进程
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """获取常驻进程池，进程数变化时重建"""
+    global _pool, _pool_workers
+
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    """关闭常驻进程池"""
+    global _pool, _pool_workers
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+        _pool_workers = 0
+
+
+atexit.register(shutdown_pool)
+
+
+def _match_sprite_task(shm_name, shape, dtype, bg_regions, bg_indices, sprite_idx, sprite_roi, sprite_region,
+                       method):
+    """
+    子进程任务：分析一个sprite区域的旋转并与部分背景区域匹配
+
+    背景掩码通过共享内存传入，避免每个任务都序列化整张背景图
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        bg_mask = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+        x, y, w, h = sprite_region
+        rotation_data = analyze_rotated_regions(sprite_roi, [(0, 0, w, h)])
+        rotation_data[0]['original_region'] = sprite_region
+
+        all_matches, evaluations = collect_matches(bg_regions, bg_mask, rotation_data, method)
+        del bg_mask
+    finally:
+        shm.close()
+
+    # 将任务内的序号换回全局序号
+    for match in all_matches:
+        match['sprite_idx'] = sprite_idx
+        match['bg_idx'] = bg_indices[match['bg_idx']]
+
+    return all_matches, evaluations
+
+
+def split_tasks(sprite_count, bg_count, workers, method):
+    """
+    按 (sprite区域, 背景区域分块) 划分任务
+
+    coarse_fine 和 pyramid 方法需要在一个sprite的所有背景区域中选取候选，因此不拆分背景区域；
+    其他方法按背景区域分块，使任务数约为进程数的两倍
+    """
+    if method in ('coarse_fine', 'pyramid') or sprite_count == 0 or bg_count == 0:
+        chunks = 1
+    else:
+        chunks = min(bg_count, max(1, -(-workers * 2 // sprite_count)))
+
+    chunk_size = -(-bg_count // chunks) if bg_count else 0
+    tasks = []
+    for sprite_idx in range(sprite_count):
+        for start in range(0, max(bg_count, 1), max(chunk_size, 1)):
+            tasks.append((sprite_idx, list(range(start, min(start + chunk_size, bg_count)))))
+    return tasks
+
+
+def parallel_collect_matches(bg_black_regions, bg_mask, sprite_mask, sprite_black_regions, method, workers):
+    """
+    使用常驻进程池并行完成每个sprite区域的旋转分析与匹配
+
+    返回:
+        (所有匹配列表, 模板匹配次数)，匹配顺序与单进程执行时相同
+    """
+    pool = get_pool(workers)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(bg_mask.nbytes, 1))
+    try:
+        shared_bg = np.ndarray(bg_mask.shape, dtype=bg_mask.dtype, buffer=shm.buf)
+        shared_bg[...] = bg_mask
+        del shared_bg
+
+        futures = []
+        for sprite_idx, bg_indices in split_tasks(len(sprite_black_regions), len(bg_black_regions), workers, method):
+            x, y, w, h = sprite_black_regions[sprite_idx]
+            futures.append(pool.submit(
+                _match_sprite_task,
+                shm.name, bg_mask.shape, bg_mask.dtype.str,
+                [bg_black_regions[i] for i in bg_indices], bg_indices,
+                sprite_idx, sprite_mask[y:y + h, x:x + w].copy(), (x, y, w, h),
+                method
+            ))
+
+        # 按任务提交顺序合并，保证冲突解决阶段与单进程结果一致
+        all_matches = []
+        evaluations = 0
+        for future in futures:
+            matches, count = future.result()
+            all_matches.extend(matches)
+            evaluations += count
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return all_matches, evaluations
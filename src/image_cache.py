@@ -0,0 +1,117 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+# 默认缓存上限（字节）
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# 每个非数组对象估算的占用（字节）
+OBJECT_OVERHEAD = 64
+
+
+def content_key(data: bytes) -> bytes:
+    """图片二进制内容的哈希，作为缓存键"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def estimate_size(value: Any) -> int:
+    """
+    估算缓存值占用的字节数
+
+    只统计拥有自身内存的数组，视图不重复计算；字典、列表、元组递归统计
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes if value.base is None else OBJECT_OVERHEAD
+    if isinstance(value, dict):
+        return OBJECT_OVERHEAD + sum(estimate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return OBJECT_OVERHEAD + sum(estimate_size(item) for item in value)
+    return OBJECT_OVERHEAD
+
+
+def freeze(array: np.ndarray) -> np.ndarray:
+    """复制数组并设为只读，避免缓存的数组被修改或是可复用的缓冲区"""
+    array = array.copy()
+    array.flags.writeable = False
+    return array
+
+
+class ByteLRUCache:
+    """
+    按占用字节数限制大小的 LRU 缓存，线程安全
+
+    超过上限时从最久未使用的项开始淘汰，单个超过上限的值不会被缓存
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        # 键 -> (值, 字节数)
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """获取缓存的值，不存在时返回 None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, size: int = None):
+        """添加或替换缓存的值，size 为空时自动估算"""
+        if size is None:
+            size = estimate_size(value)
+
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            if size > self.max_bytes:
+                return
+
+            self._items[key] = (value, size)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._items:
+            _, (_, size) = self._items.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def resize(self, max_bytes: int):
+        """修改缓存上限，超出的部分立即淘汰"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """命中、未命中、淘汰次数及当前占用"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._items),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+# 验证码识别使用的共享缓存：解码后的图像、预处理掩码、黑色区域和旋转库
+image_cache = ByteLRUCache()
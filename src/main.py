@@ -1,60 +1,53 @@
 import base64
 import hashlib
-
-import time
+import json
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
 from json import JSONDecodeError
-from pathlib import Path
-from typing import Any
+from typing import Any, Iterator, Optional
 import requests
 
-from py_mini_racer import MiniRacer
-
-from src.ICR import find_part_positions
 from src.auth_process import AuthInfo, AuthProcess
+from src.captcha_prefetch import get_captcha_prefetcher
 from src.config import Config
-from src.utils import get_base_path, json_parse, json_stringify
-
-base_path = get_base_path()
-
+from src.endpoints import get_endpoints
+from src.http_client import add_metric_hosts, get_http_client
+from src.metrics import CAPTCHA_ATTEMPTS, CAPTCHA_VERIFY, POW_SECONDS, TDC_SECONDS
+from src.orchestrator import get_concurrency, map_ordered
+from src.pow_solver import get_pow_workers, solve_pow
+from src.tdc_pool import get_tdc_pool
+from src.timing import NULL_TIMINGS, Timings
+from src.utils import json_parse, json_stringify
 
-def get_collect_and_eks(tdc):
-    ctx = MiniRacer()
+# 同时下载验证码图片、TDC 脚本的线程池
+_fetch_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='captcha-fetch')
 
-    with open(Path(base_path) / 'static' / 'env.js', 'r', encoding='utf-8') as f:
-        ctx.eval(f.read())
 
-    ctx.eval(tdc)
+def timed_call(timings, name, func, *args, **kwargs):
+    """在 timings 中记录一次函数调用的耗时"""
+    with timings.span(name):
+        return func(*args, **kwargs)
 
-    ctx.eval('window.TDC && "function" == typeof window.TDC.setData && window.TDC.setData("qf_7Pf__H")')
 
-    tdc_data = ctx.eval(
-        '(window.TDC && "function" == typeof window.TDC.getData) ? window.TDC.getData(true) || "---" : "------"'
-    )
+def load_captcha_dependencies():
+    """
+    导入识别验证码需要的模块（OpenCV、NumPy）
 
-    tdc_info = ctx.eval(
-        '(window.TDC && "function" == typeof window.TDC.getInfo) ? window.TDC.getInfo().info || "---" : "------"'
-    )
-    return tdc_data, tdc_info
+    这些模块只在自动完成验证码时才需要，签到状态检测、手动签到等不会导入，可以在任意线程中调用。
+    自动签到、完成验证码会在提交到线程池之前自动调用，入口处提前调用可避免第一次识别时等待导入。
+    执行 TDC 脚本的 V8 在导入本模块时于当前线程中初始化，不在此延迟导入
+    """
+    import src.ICR
 
 
-def find_md5_collision(target_md5, prefix):
-    start_time = time.time()
-    num = 0
+def get_collect_and_eks(tdc, pool_options=None):
+    # 使用预先执行过 env.js 的运行环境池，避免每次都重新创建 MiniRacer
+    return get_tdc_pool(pool_options).get_collect_and_eks(tdc)
 
-    while True:
-        current_str = prefix + str(num)
-        # 计算MD5
-        md5_hash = hashlib.md5(current_str.encode('utf-8')).hexdigest()
 
-        if md5_hash == target_md5:
-            end_time = time.time()
-            elapsed_ms = int((end_time - start_time) * 1000)  # 转换为毫秒
-            return current_str, elapsed_ms
-
-        num += 1
-
-        if num > 114514 * 1000:
-            return prefix, int((time.time() - start_time) * 1000)
+def find_md5_collision(target_md5, prefix, workers=None, stats=None):
+    # 多进程求解，前缀只哈希一次，返回 (答案, 耗时毫秒)
+    return solve_pow(target_md5, prefix, workers, stats)
 
 
 def check_in(data, auth_info):
@@ -76,12 +69,11 @@ def check_in(data, auth_info):
 
     try:
         # 转发请求到目标API
-        response = requests.post(
-            "https://api.v2.rainyun.com/user/reward/tasks",
+        response = auth_info.http.post(
+            f"{auth_info.api_base_url}/user/reward/tasks",
             headers=auth_info.headers,
             cookies=auth_info.cookies,
-            json=data,
-            timeout=10
+            json=data
         )
 
         # 更新cookie
@@ -102,11 +94,10 @@ def get_check_in_status(auth_info):
 
     try:
         # 获取任务列表
-        response = requests.get(
-            "https://api.v2.rainyun.com/user/reward/tasks",
+        response = auth_info.http.get(
+            f"{auth_info.api_base_url}/user/reward/tasks",
             headers=auth_info.headers,
-            cookies=auth_info.cookies,
-            timeout=10
+            cookies=auth_info.cookies
         )
 
         # 更新cookie
@@ -148,7 +139,13 @@ def multi_return(results, multi):
 
 
 class MainLogic:
-    def __init__(self, config_path='config.json', config_data=None, no_need_auth=False):
+    def __init__(self, config_path='config.json', config_data=None, no_need_auth=False,
+                 cpu_executor: Optional[Executor] = None):
+        """
+        参数:
+            cpu_executor: 执行识别、预处理、TDC 和 PoW 等计算阶段的线程池，默认在当前线程中执行。
+                          网页模式使用有界的线程池，避免同时进行的签到请求占满 CPU
+        """
         # 公共请求头
         self.common_headers = {
             "accept": "application/json, text/plain, */*",
@@ -181,65 +178,97 @@ class MainLogic:
         self.config = Config(config_path, config_data)
 
         self.common_headers = self.common_headers | self.config.get_headers()
+        endpoints = get_endpoints(self.config)
+        self.captcha_config['base_url'] = endpoints['captcha']
+        add_metric_hosts(*endpoints.values())
+
+        # 共享的 HTTP 客户端（连接池、重试、超时），也用于认证处理
+        self.http = get_http_client(self.config.get('http'))
+        # 多账号时同时处理的账号数量
+        self.concurrency = get_concurrency(self.config)
+        self.cpu_executor = cpu_executor
+
+    def run_cpu(self, func, *args, **kwargs):
+        """在计算线程池中执行一个计算阶段并等待结果，func 中不能再调用 run_cpu"""
+        if self.cpu_executor is None:
+            return func(*args, **kwargs)
+        return self.cpu_executor.submit(func, *args, **kwargs).result()
+
+    def auto_check_in(self, auth_list=None, force=False, match_method='template', workers=None,
+                      collect_timings=False):
+        """
+        自动签到
+
+        参数:
+            collect_timings: 是否在每个账号的结果中返回各阶段耗时（timings 字段）
+        """
+        # 并发处理账号之前导入识别依赖
+        load_captcha_dependencies()
 
-    def auto_check_in(self, auth_list=None, force=False, match_method='template'):
         multi = False
         if auth_list is None:
-            auth_process = AuthProcess(self.config, self.common_headers)
+            auth_process = AuthProcess(self.config, self.common_headers, self.http)
             multi = auth_process.multi
-            auth_list = auth_process.enumerate()
+            auth_list = auth_process.enumerate(self.concurrency)
         if isinstance(auth_list, AuthInfo):
             auth_list = [auth_list]
         if isinstance(auth_list, AuthProcess):
             multi = auth_list.multi
-            auth_list = auth_list.enumerate()
+            auth_list = auth_list.enumerate(self.concurrency)
 
-        if not isinstance(auth_list, list):
+        # 认证信息可以是列表，也可以是 AuthProcess.enumerate 返回的生成器
+        if not isinstance(auth_list, (list, tuple, Iterator)):
             return {'error': '未提供认证信息。'}
 
-        results = []
-
-        for auth_info in auth_list:
+        def process(auth_info):
             if not isinstance(auth_info, AuthInfo):
-                results.append({'error': '认证信息不正确。'})
-                continue
+                return {'error': '认证信息不正确。'}
 
             if auth_info.error:
-                results.append(auth_info.error)
-                continue
+                return auth_info.error
 
             name_prefix = f"{auth_info.name} " if multi else ''
+            timings = Timings() if collect_timings else NULL_TIMINGS
+
+            def with_timings(result):
+                if timings.enabled and isinstance(result, dict):
+                    result['timings'] = timings.summary()
+                return result
 
             if not force:
-                if get_check_in_status(auth_info).get('check_in'):
-                    results.append({'error': f"{name_prefix}今日已经签到。"})
-                    continue
+                with timings.span('status'):
+                    checked_in = get_check_in_status(auth_info).get('check_in')
+                if checked_in:
+                    return with_timings({'error': f"{name_prefix}今日已经签到。"})
 
             verify = {"error": f"{name_prefix}自动签到未知错误。"}
             try:
-                verify = self.complete_captcha(match_method=match_method)
+                verify = self.complete_captcha(match_method=match_method, workers=workers, timings=timings)
             except Exception as e:
                 verify['error'] = name_prefix + str(e)
             if "error" in verify:
-                results.append({'error': name_prefix + verify['error']})
-                continue
+                return with_timings({'error': name_prefix + verify['error']})
 
-            result = check_in({
-                "task_name": "每日签到",
-                "verifyCode": "",
-                "vticket": verify['ticket'],
-                "vrandstr": verify['randstr']
-            }, auth_info)
+            with timings.span('check_in'):
+                result = check_in({
+                    "task_name": "每日签到",
+                    "verifyCode": "",
+                    "vticket": verify['ticket'],
+                    "vrandstr": verify['randstr']
+                }, auth_info)
 
             if multi:
                 result['name'] = auth_info.name
 
-            results.append(result)
+            return with_timings(result)
+
+        # 多个账号并发签到，结果保持原顺序
+        results = list(map_ordered(process, auth_list, self.concurrency))
 
         return multi_return(results, multi)
 
     def check_in(self, data):
-        auth_process = AuthProcess(self.config, self.common_headers)
+        auth_process = AuthProcess(self.config, self.common_headers, self.http)
         multi = auth_process.multi
         if multi:
             if not isinstance(data, list):
@@ -249,26 +278,30 @@ class MainLogic:
             data_list = data
         else:
             data_list = data if isinstance(data, list) else [data]
-        results = []
-        for i, auth_info in enumerate(auth_process.enumerate()):
-            data = data_list[i]
+
+        def process(item):
+            auth_info, data = item
             result = check_in(data, auth_info)
             if multi:
                 result['name'] = auth_info.name
-            results.append(result)
+            return result
+
+        auth_list = auth_process.enumerate(self.concurrency)
+        results = list(map_ordered(process, zip(auth_list, data_list), self.concurrency))
 
         return multi_return(results, multi)
 
     def get_check_in_status(self):
-        auth_process = AuthProcess(self.config, self.common_headers)
+        auth_process = AuthProcess(self.config, self.common_headers, self.http)
         multi = auth_process.multi
 
-        results = []
-        for i, auth_info in enumerate(auth_process.enumerate()):
+        def process(auth_info):
             result = get_check_in_status(auth_info)
             if multi:
                 result['name'] = auth_info.name
-            results.append(result)
+            return result
+
+        results = list(map_ordered(process, auth_process.enumerate(self.concurrency), self.concurrency))
 
         return multi_return(results, multi)
 
@@ -302,7 +335,7 @@ class MainLogic:
 
         try:
             # 获取验证码配置
-            response = requests.get(
+            response = self.http.get(
                 f"{self.captcha_config.get('base_url')}/cap_union_prehandle",
                 params=params,
                 headers=self.common_headers
@@ -320,7 +353,7 @@ class MainLogic:
     def refresh_captcha_data(self, old_data):
         try:
             # 获取验证码配置
-            response = requests.post(
+            response = self.http.post(
                 f"{self.captcha_config.get('base_url')}/cap_union_new_getsig",
                 data={
                     'sess': old_data.get('sess')
@@ -346,31 +379,59 @@ class MainLogic:
         sprite_url = sprite_url or (self.captcha_config.get('base_url') + data["data"]["dyn_show_info"]["sprite_url"])
         return bg_url, sprite_url
 
-    def get_captcha_images(self, data=None, bg_url=None, sprite_url=None) \
+    def fetch_captcha_image(self, url, name, preprocess=False, timings=NULL_TIMINGS):
+        """
+        下载一张验证码图片
+
+        参数:
+            name: bg 或 sprite
+            preprocess: 下载完成后立即解码并预处理，结果存入识别缓存，识别时不需要再次处理
+        """
+        with timings.span(f'fetch_{name}'):
+            content = self.http.get(url, headers=self.common_headers).content
+
+        if preprocess:
+            from src.ICR import prepare_background, prepare_sprite
+
+            self.run_cpu(prepare_background if name == 'bg' else prepare_sprite, content, timings=timings)
+        return content
+
+    def get_captcha_images(self, data=None, bg_url=None, sprite_url=None, preprocess=False, timings=NULL_TIMINGS) \
             -> tuple[bytes | Any, bytes | Any] | tuple[None, None]:
+        """
+        同时下载背景图片和需选图片
+
+        参数:
+            preprocess: 是否在下载完成后立即解码并预处理，先下载完成的图片先处理
+            timings: 记录下载和预处理耗时
+        """
         # 获取图片URL
         bg_url, sprite_url = self.get_captcha_urls(data, bg_url, sprite_url)
         try:
-            # 下载图片
-            return (
-                requests.get(bg_url, headers=self.common_headers).content,
-                requests.get(sprite_url, headers=self.common_headers).content
-            )
+            # 背景图片在线程池中下载，需选图片在当前线程下载
+            bg_future = _fetch_executor.submit(self.fetch_captcha_image, bg_url, 'bg', preprocess, timings)
+            sprite_img = self.fetch_captcha_image(sprite_url, 'sprite', preprocess, timings)
+            return bg_future.result(), sprite_img
         except Exception as e:
             raise Exception(f"获取验证码图片失败: {e}")
 
-    def build_verify_form(self, data, positions, old_verify=None):
+    def build_verify_form(self, data, positions, old_verify=None, timings=NULL_TIMINGS):
         if old_verify is None:
             comm_captcha_cfg = data['data']['comm_captcha_cfg']
-            tdc_content = requests.get(
-                self.captcha_config['base_url'] + comm_captcha_cfg['tdc_path'],
-                headers=self.common_headers
-            ).text
-            collect, eks = get_collect_and_eks(tdc_content)
-            pow_answer, pow_calc_time = find_md5_collision(
-                comm_captcha_cfg['pow_cfg']['md5'],
-                comm_captcha_cfg['pow_cfg']['prefix'],
-            )
+            with timings.span('fetch_tdc'):
+                tdc_content = self.http.get(
+                    self.captcha_config['base_url'] + comm_captcha_cfg['tdc_path'],
+                    headers=self.common_headers
+                ).text
+            with timings.span('tdc'), TDC_SECONDS.time():
+                collect, eks = self.run_cpu(get_collect_and_eks, tdc_content, self.config.get('tdc_pool'))
+            with timings.span('pow'), POW_SECONDS.time():
+                pow_answer, pow_calc_time = self.run_cpu(
+                    find_md5_collision,
+                    comm_captcha_cfg['pow_cfg']['md5'],
+                    comm_captcha_cfg['pow_cfg']['prefix'],
+                    get_pow_workers(self.config)
+                )
         else:
             collect = old_verify['collect']
             eks = old_verify['eks']
@@ -395,36 +456,119 @@ class MainLogic:
             'pow_calc_time': str(pow_calc_time)
         }
 
-    def complete_captcha(self, data=None, retry=10, match_method='template'):
-        data = data or self.get_captcha_data()
-        bg_img, sprite_img = self.get_captcha_images(data)
-
-        form_data = self.build_verify_form(data, [])
+    def prepare_captcha(self, data=None, timings=NULL_TIMINGS):
+        """
+        获取验证码数据和图片，并预先计算 collect/eks 和 PoW 答案
+
+        图片下载、预处理与 TDC 脚本下载、执行和 PoW 计算同时进行
+
+        返回:
+            (验证码数据, 背景图片, 需选图片, 校验表单)
+        """
+        # 提交到线程池之前导入识别依赖
+        load_captcha_dependencies()
+
+        if not data:
+            with timings.span('prehandle'):
+                data = self.get_captcha_data()
+
+        form_future = _fetch_executor.submit(self.build_verify_form, data, [], None, timings)
+        bg_img, sprite_img = self.get_captcha_images(data, preprocess=True, timings=timings)
+
+        form_data = form_future.result()
+        return data, bg_img, sprite_img, form_data
+
+    def get_captcha_prefetcher(self):
+        """获取当前配置的验证码预取队列，未开启预取时返回 None"""
+        # 预取使用第一次创建队列的实例的请求头和认证，不同请求头、认证（如网页接口传入的 x-api-key）使用不同的队列
+        identity = hashlib.sha256(json.dumps(
+            [self.common_headers, self.config.get('auth'), self.config.get('http')],
+            sort_keys=True, ensure_ascii=False, default=str
+        ).encode()).hexdigest()
+        return get_captcha_prefetcher(
+            (
+                os.path.abspath(self.config.config_path) if self.config.config_path else None,
+                self.captcha_config.get('base_url'),
+                self.captcha_config.get('aid'),
+                identity
+            ),
+            self.prepare_captcha,
+            self.config.get('captcha_prefetch')
+        )
 
+    def complete_captcha(self, data=None, retry=10, match_method='template', workers=None, timings=NULL_TIMINGS,
+                         pipeline=True):
+        """
+        完成验证码
+
+        参数:
+            pipeline: 校验请求进行中时同时计算次优匹配，校验失败后如果刷新得到的图片不变，
+                      直接使用次优匹配重试，不需要重新识别
+            timings: 记录各阶段耗时（获取验证码、下载图片、识别、TDC、PoW、校验等）
+        """
+        # 识别依赖 OpenCV 和 NumPy，只在完成验证码时导入
+        load_captcha_dependencies()
+        from src.ICR import find_part_candidates
+
+        # 未指定验证码数据时优先使用预取的验证码，只需识别和校验
+        session = None
+        if data is None:
+            prefetcher = self.get_captcha_prefetcher()
+            session = prefetcher.pop() if prefetcher is not None else None
+
+        data, bg_img, sprite_img, form_data = session or self.prepare_captcha(data, timings)
+
+        positions = None
+        alternative = None
         for i in range(retry):
-            positions = find_part_positions(bg_img, sprite_img, match_method)
+            if positions is None:
+                positions, alternative = self.run_cpu(
+                    find_part_candidates, bg_img, sprite_img, match_method, workers, timings
+                )
 
             form_data = self.build_verify_form(data, positions, form_data)
 
-            response = requests.post(
-                self.captcha_config['base_url'] + '/cap_union_new_verify',
-                data=form_data,
-                headers=self.common_headers
-            )
+            # 校验请求进行中时计算次优匹配
+            alternative_future = None
+            if pipeline and alternative:
+                alternative_future = (self.cpu_executor or _fetch_executor).submit(
+                    timed_call, timings, 'alternative', alternative
+                )
+
+            with timings.span('verify'):
+                response = self.http.post(
+                    self.captcha_config['base_url'] + '/cap_union_new_verify',
+                    data=form_data,
+                    headers=self.common_headers
+                )
             response.raise_for_status()  # 检查请求是否成功
 
             result = response.json()
 
             if int(result['errorCode']) == 0:
+                CAPTCHA_VERIFY.inc(method=match_method, result='success')
+                CAPTCHA_ATTEMPTS.observe(i + 1, method=match_method, result='success')
                 return result
             else:
+                CAPTCHA_VERIFY.inc(method=match_method, result='failure')
                 if i < retry:
                     data['sess'] = result['sess']
 
-                    data = self.refresh_captcha_data(data)
+                    with timings.span('refresh'):
+                        data = self.refresh_captcha_data(data)
+
+                    new_bg_img, new_sprite_img = self.get_captcha_images(data, preprocess=True, timings=timings)
+
+                    positions = None
+                    if alternative_future is not None and \
+                            bg_img == new_bg_img and sprite_img == new_sprite_img:
+                        # 图片没有变化，使用次优匹配重试，每组图片只使用一次次优匹配
+                        positions = alternative_future.result()
+                        alternative = None
 
-                    bg_img, sprite_img = self.get_captcha_images(data)
+                    bg_img, sprite_img = new_bg_img, new_sprite_img
                 else:
                     return {'error': f"超出重试次数。最后认证结果: {json_stringify(result)}"}
 
+        CAPTCHA_ATTEMPTS.observe(retry, method=match_method, result='failure')
         return {'error': "超出重试次数。"}
@@ -0,0 +1,2 @@
+# 可用的匹配方法，单独放在不依赖 OpenCV 的模块中，命令行参数解析等不需要导入识别模块
+MATCH_METHODS = ('template', 'brute', 'speed', 'coarse_fine', 'fft', 'pyramid')
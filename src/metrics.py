@@ -0,0 +1,265 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# 耗时直方图默认的分桶上限（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    items = [f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        items.append(extra)
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    指标基类，按标签值分别记录，线程安全
+
+    标签值在记录时通过关键字参数传入，必须与 label_names 一致
+    """
+
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"指标 {self.name} 的标签必须为: {', '.join(self.label_names)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(指标名称后缀, 标签文本, 值)"""
+        with self._lock:
+            return [('', format_labels(self.label_names, key), value) for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}"
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """只增不减的计数"""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """可增可减的当前值，如进行中的请求数"""
+
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        """with 代码块执行期间值加 1"""
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+
+class Histogram(Metric):
+    """按分桶统计的分布，如耗时"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # 每个分桶的数量（非累计）、总和、总数
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """记录 with 代码块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get(self, **labels) -> Tuple[float, int]:
+        """(总和, 总数)"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[1], state[2]) if state else (0.0, 0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            values = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+
+        result = []
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts + [count - sum(counts)]):
+                cumulative += bucket_count
+                le = f'le="{format_value(bound)}"'
+                result.append(('_bucket', format_labels(self.label_names, key, le), cumulative))
+            labels = format_labels(self.label_names, key)
+            result.append(('_sum', labels, total))
+            result.append(('_count', labels, count))
+        return result
+
+
+class Registry:
+    """
+    指标注册表，输出 Prometheus 文本格式
+
+    collector 为渲染时调用的函数，返回额外的文本行，用于导出其他模块已有的统计（如识别缓存）
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标 {metric.name} 已存在")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            # noinspection PyBroadException
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                print(f"警告: 收集指标失败: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+def render_value(name: str, documentation: str, value: float, metric_type: str = 'gauge') -> List[str]:
+    """输出一个无标签的指标，用于 collector"""
+    return [
+        f"# HELP {name} {documentation}",
+        f"# TYPE {name} {metric_type}",
+        f"{name} {format_value(value)}"
+    ]
+
+
+# 进程内共享的注册表和各模块使用的指标
+registry = Registry()
+
+ICR_SOLVE_SECONDS = registry.histogram(
+    'rainyun_icr_solve_seconds', '验证码识别耗时（秒），包含解码和预处理', ['method']
+)
+POW_SECONDS = registry.histogram('rainyun_pow_seconds', '验证码 PoW 计算耗时（秒）')
+TDC_SECONDS = registry.histogram('rainyun_tdc_seconds', '执行 TDC 脚本获取 collect 和 eks 的耗时（秒）')
+UPSTREAM_REQUEST_SECONDS = registry.histogram(
+    'rainyun_upstream_request_seconds', '请求验证码和雨云接口的耗时（秒），status 为 error 表示请求失败',
+    ['host', 'method', 'status']
+)
+UPSTREAM_RETRIES = registry.counter(
+    'rainyun_upstream_retries_total', '请求验证码和雨云接口时自动重试的次数', ['host']
+)
+UPSTREAM_IN_PROGRESS = registry.gauge(
+    'rainyun_upstream_requests_in_progress', '进行中的验证码和雨云接口请求数', ['host']
+)
+CAPTCHA_VERIFY = registry.counter(
+    'rainyun_captcha_verify_total', '验证码校验次数，result 为 success 或 failure', ['method', 'result']
+)
+CAPTCHA_ATTEMPTS = registry.histogram(
+    'rainyun_captcha_attempts', '每次完成验证码使用的校验次数（1 为没有重试）', ['method', 'result'],
+    buckets=(1, 2, 3, 4, 5, 10)
+)
+WEB_REQUEST_SECONDS = registry.histogram(
+    'rainyun_web_request_seconds', '网页接口的处理耗时（秒）', ['path', 'status']
+)
+WEB_IN_PROGRESS = registry.gauge(
+    'rainyun_web_requests_in_progress', '进行中的网页接口请求数', ['path']
+)
@@ -0,0 +1,59 @@
+from collections import deque
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# 同时处理的账号数量，可在配置文件的 concurrency 字段中修改
+DEFAULT_CONCURRENCY = 4
+
+
+def get_concurrency(config) -> int:
+    """从配置中读取并发数量，无效时使用默认值"""
+    value = config.get('concurrency', DEFAULT_CONCURRENCY)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        print(f"警告: 忽略无效的 concurrency 配置: {value}")
+        return DEFAULT_CONCURRENCY
+    return value
+
+
+def map_ordered(func: Callable[[T], R], items: Iterable[T], concurrency: int = DEFAULT_CONCURRENCY) -> Iterator[R]:
+    """
+    并发处理多个账号，按输入顺序逐个返回结果
+
+    账号可以是惰性生成的（例如仍在获取 CSRF 令牌），生成一个就提交一个，不需要等待全部生成；
+    前面的结果一完成就会返回，不需要等待所有账号处理完毕。并发数量小于等于 1 或只有一个账号时直接在当前线程中执行
+
+    参数:
+        func: 处理单个账号的函数
+        items: 账号列表或生成器
+        concurrency: 最大并发数量
+
+    返回:
+        按输入顺序排列的结果迭代器
+    """
+    if concurrency <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    # 先取出前两个账号，只有一个账号时不创建线程池
+    items = iter(items)
+    head = [item for _, item in zip(range(2), items)]
+    if len(head) < 2:
+        for item in head:
+            yield func(item)
+        return
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='account') as executor:
+        for item in chain(head, items):
+            pending.append(executor.submit(func, item))
+            # 已完成的结果先返回
+            while pending and pending[0].done():
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
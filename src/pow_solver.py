@@ -0,0 +1,253 @@
+import atexit
+import hashlib
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# 与原实现一致的最大尝试次数，超过后返回前缀本身
+MAX_NONCE = 114514 * 1000
+# 先在当前进程中搜索的数量，大多数PoW难度较低，无需启动进程池
+INLINE_NONCES = 1 << 16
+# 每个进程任务搜索的数量
+BLOCK_SIZE = 1 << 18
+# 任务内检查其他进程是否已找到答案的间隔
+CHECK_INTERVAL = 1 << 12
+# 同时进行的并行求解数量上限，每次求解占用共享数组中的一个位置记录已找到的答案
+MAX_PARALLEL_SOLVES = 16
+# 默认的求解进程数，1 为只在当前进程中搜索，可在配置文件的 pow_workers 字段中修改
+DEFAULT_POW_WORKERS = 1
+
+# 子进程中共享的“已找到的最小答案”数组，未找到时大于 MAX_NONCE
+_found = None
+
+# 常驻进程池，在多次求解之间复用。网页模式和多账号并发时在已有多个线程的进程中创建，
+# 使用 spawn 启动子进程，不复制父进程的线程和 V8 状态
+_pool = None
+_pool_workers = 0
+_pool_found = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+class FoundSlot:
+    """共享答案数组中的一个位置，提供与 multiprocessing.Value 相同的 value 和 get_lock"""
+
+    def __init__(self, array, index):
+        self.array = array
+        self.index = index
+
+    @property
+    def value(self):
+        return self.array[self.index]
+
+    @value.setter
+    def value(self, value):
+        self.array[self.index] = value
+
+    def get_lock(self):
+        return self.array.get_lock()
+
+
+def get_pow_workers(config) -> int:
+    """从配置中读取 PoW 求解进程数，无效时使用默认值"""
+    value = config.get('pow_workers', DEFAULT_POW_WORKERS)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        print(f"警告: 忽略无效的 pow_workers 配置: {value}")
+        return DEFAULT_POW_WORKERS
+    return value
+
+
+def _init_worker(found):
+    global _found
+    _found = found
+
+
+def parse_digest(target_md5):
+    """将目标MD5转换为字节，格式不正确时返回None（不可能匹配）"""
+    if not isinstance(target_md5, str) or not re.fullmatch(r'[0-9a-f]{32}', target_md5):
+        return None
+    return bytes.fromhex(target_md5)
+
+
+def search_range(digest, prefix, start, stop, found=None):
+    """
+    在 [start, stop) 中搜索使 md5(prefix + str(num)) 等于 digest 的 num
+
+    参数:
+        digest: 目标MD5字节
+        prefix: 前缀
+        start, stop: 搜索范围
+        found: 共享的已找到答案，其他进程找到更小的答案时提前结束
+
+    返回:
+        (答案或None, 计算的哈希次数)
+    """
+    # 前缀只哈希一次，之后每次复制哈希状态再追加数字
+    copy = hashlib.md5(prefix.encode('utf-8')).copy
+
+    for chunk_start in range(start, stop, CHECK_INTERVAL):
+        if found is not None and found.value < chunk_start:
+            return None, chunk_start - start
+
+        for num in range(chunk_start, min(chunk_start + CHECK_INTERVAL, stop)):
+            md5 = copy()
+            md5.update(b'%d' % num)
+            if md5.digest() == digest:
+                if found is not None:
+                    with found.get_lock():
+                        if num < found.value:
+                            found.value = num
+                return num, num - start + 1
+
+    return None, stop - start
+
+
+def _search_block(digest, prefix, start, stop, slot):
+    """子进程任务：搜索一个范围，slot 为本次求解在共享答案数组中的位置"""
+    return search_range(digest, prefix, start, stop, FoundSlot(_found, slot))
+
+
+def get_pool(workers: int):
+    """获取常驻进程池、共享答案数组和空闲位置队列，进程数变化时重建"""
+    global _pool, _pool_workers, _pool_found, _pool_slots
+
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            context = multiprocessing.get_context('spawn')
+            _pool_found = context.Array('q', [MAX_NONCE + 1] * MAX_PARALLEL_SOLVES)
+            _pool_slots = queue.Queue()
+            for index in range(MAX_PARALLEL_SOLVES):
+                _pool_slots.put(index)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(_pool_found,)
+            )
+            _pool_workers = workers
+        return _pool, _pool_found, _pool_slots
+
+
+def shutdown_pool():
+    """关闭常驻进程池"""
+    global _pool, _pool_workers, _pool_found, _pool_slots
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+        _pool_workers = 0
+        _pool_found = None
+        _pool_slots = None
+
+
+atexit.register(shutdown_pool)
+
+
+def parallel_search(digest, prefix, start, stop, workers):
+    """
+    将 [start, stop) 按块分配到进程池中搜索
+
+    任务按顺序提交和收集，某个任务找到答案后不再提交新任务，编号更大的任务提前结束，
+    编号更小的任务继续完成，因此返回的一定是范围内最小的答案，与单进程顺序搜索一致。
+    每次求解使用各自的共享答案位置，多个账号可以同时求解
+
+    返回:
+        (答案或None, 计算的哈希次数)
+    """
+    pool, array, slots = get_pool(workers)
+    slot = slots.get()
+    try:
+        found = FoundSlot(array, slot)
+        found.value = MAX_NONCE + 1
+
+        answer = None
+        hashes = 0
+        pending = deque()
+        next_start = start
+
+        while pending or next_start < stop:
+            while next_start < stop and len(pending) < workers * 2 and found.value > MAX_NONCE:
+                block_stop = min(next_start + BLOCK_SIZE, stop)
+                pending.append(pool.submit(_search_block, digest, prefix, next_start, block_stop, slot))
+                next_start = block_stop
+
+            if not pending:
+                break
+
+            num, count = pending.popleft().result()
+            hashes += count
+            if num is not None and (answer is None or num < answer):
+                answer = num
+
+        return answer, hashes
+    finally:
+        slots.put(slot)
+
+
+def solve_pow(target_md5, prefix, workers=None, stats=None):
+    """
+    求解PoW：找到最小的 num 使 md5(prefix + str(num)) 等于 target_md5
+
+    参数:
+        target_md5: 目标MD5（小写十六进制）
+        prefix: 前缀
+        workers: 进程数，None 时使用 DEFAULT_POW_WORKERS，小于等于1时只在当前进程中搜索
+        stats: 可选的字典，写入哈希次数、耗时和哈希速度
+
+    返回:
+        (答案字符串, 耗时毫秒)，超过最大尝试次数时答案为前缀本身
+    """
+    start_time = time.perf_counter()
+    workers = DEFAULT_POW_WORKERS if workers is None else workers
+
+    digest = parse_digest(target_md5)
+    answer = None
+    hashes = 0
+    used_workers = 1
+
+    if digest is not None:
+        answer, hashes = search_range(digest, prefix, 0, min(INLINE_NONCES, MAX_NONCE + 1))
+
+        if answer is None and INLINE_NONCES <= MAX_NONCE:
+            if workers > 1:
+                used_workers = workers
+                answer, count = parallel_search(digest, prefix, INLINE_NONCES, MAX_NONCE + 1, workers)
+            else:
+                answer, count = search_range(digest, prefix, INLINE_NONCES, MAX_NONCE + 1)
+            hashes += count
+
+    elapsed = time.perf_counter() - start_time
+    elapsed_ms = int(elapsed * 1000)
+
+    if stats is not None:
+        stats['hashes'] = hashes
+        stats['elapsed_ms'] = elapsed_ms
+        stats['hashes_per_sec'] = int(hashes / elapsed) if elapsed > 0 else 0
+        stats['workers'] = used_workers
+
+    if answer is None:
+        return prefix, elapsed_ms
+    return prefix + str(answer), elapsed_ms
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='PoW求解性能测试')
+    parser.add_argument('-n', '--nonce', type=int, default=3000000, help='答案数字')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='进程数，默认使用CPU核心数')
+    args = parser.parse_args()
+
+    test_prefix = 'benchmark_'
+    test_target = hashlib.md5(f'{test_prefix}{args.nonce}'.encode('utf-8')).hexdigest()
+
+    for count in sorted({1, args.workers or os.cpu_count() or 1}):
+        result_stats = {}
+        result = solve_pow(test_target, test_prefix, count, result_stats)
+        print(f"进程数 {count}: 答案 {result[0]}, 耗时 {result[1]} ms, "
+              f"哈希 {result_stats['hashes']} 次, {result_stats['hashes_per_sec']} 次/秒")
@@ -0,0 +1,292 @@
+import heapq
+from typing import List, Tuple, Optional
+
+Rect = Tuple[int, int, int, int]
+
+
+def should_merge(rect1: Rect, rect2: Rect, overlap_threshold: float = 0.0) -> bool:
+    """判断两个矩形是否应该合并
+
+    Args:
+        rect1: 第一个矩形 (x, y, width, height)
+        rect2: 第二个矩形 (x, y, width, height)
+        overlap_threshold: 重叠面积占较小矩形面积的比例阈值
+
+    Returns:
+        bool: 如果应该合并返回True，否则返回False
+    """
+    x1, y1, w1, h1 = rect1
+    x2, y2, w2, h2 = rect2
+
+    # 计算两个矩形的交集区域
+    x_left = max(x1, x2)
+    y_top = max(y1, y2)
+    x_right = min(x1 + w1, x2 + w2)
+    y_bottom = min(y1 + h1, y2 + h2)
+
+    if x_right <= x_left or y_bottom <= y_top:
+        return False  # 没有交集
+
+    # 如果阈值为0，只要有重叠就合并
+    if overlap_threshold == 0:
+        return True
+
+    # 计算交集面积
+    intersection_area = (x_right - x_left) * (y_bottom - y_top)
+
+    # 计算两个矩形中较小矩形的面积
+    area1 = w1 * h1
+    area2 = w2 * h2
+    min_area = min(area1, area2)
+
+    # 如果交集面积超过较小矩形面积的阈值比例，则合并
+    return intersection_area > overlap_threshold * min_area
+
+
+def rect_distance(r1: Rect, r2: Rect) -> float:
+    """计算两个矩形边缘之间的最小欧几里得距离，重叠或相接时为0"""
+    # 矩形1的坐标
+    x1, y1, w1, h1 = r1
+    x1_end, y1_end = x1 + w1, y1 + h1
+
+    # 矩形2的坐标
+    x2, y2, w2, h2 = r2
+    x2_end, y2_end = x2 + w2, y2 + h2
+
+    # 计算水平距离
+    if x1_end < x2:
+        dx = x2 - x1_end
+    elif x2_end < x1:
+        dx = x1 - x2_end
+    else:
+        dx = 0
+
+    # 计算垂直距离
+    if y1_end < y2:
+        dy = y2 - y1_end
+    elif y2_end < y1:
+        dy = y1 - y2_end
+    else:
+        dy = 0
+
+    # 返回欧几里得距离
+    return (dx ** 2 + dy ** 2) ** 0.5
+
+
+class UnionFind:
+    """并查集（路径压缩 + 按大小合并）"""
+
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, a: int, b: int) -> bool:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return True
+
+
+def _connect(rects: List[Rect], max_distance: Optional[float]) -> UnionFind:
+    """
+    扫描线查找所有需要合并的矩形对，并用并查集连接
+
+    矩形按左边界排序依次扫描，只与右边界（加上合并距离）仍未越过当前左边界的活动矩形比较。
+    max_distance 为 None 时只连接有重叠面积的矩形，否则连接边缘距离不超过 max_distance 的矩形
+    """
+    uf = UnionFind(len(rects))
+    order = sorted(range(len(rects)), key=lambda i: rects[i][0])
+    reach = 0 if max_distance is None else max_distance
+
+    # 活动矩形：按 右边界 + 合并距离 建堆，便于移除已越过扫描线的矩形
+    active_heap = []
+    active = set()
+
+    for i in order:
+        x, y, w, h = rects[i]
+
+        while active_heap and (
+                active_heap[0][0] <= x if max_distance is None else active_heap[0][0] < x
+        ):
+            active.discard(heapq.heappop(active_heap)[1])
+
+        for j in active:
+            if max_distance is None:
+                connected = should_merge(rects[i], rects[j])
+            else:
+                connected = rect_distance(rects[i], rects[j]) <= max_distance
+            if connected:
+                uf.union(i, j)
+
+        active.add(i)
+        heapq.heappush(active_heap, (x + w + reach, i))
+
+    return uf
+
+
+def _cluster(rectangles: List[Rect], max_distance: Optional[float]) -> List[Rect]:
+    """
+    反复合并相连的矩形直到不再变化
+
+    每一轮用扫描线 + 并查集求出连通分量并替换为外接矩形，外接矩形变大后可能与其他矩形相连，
+    因此继续下一轮，直到矩形数量不再减少。结果按每组中最早出现的矩形顺序排列，
+    与逐对合并直到不动点的结果完全一致
+    """
+    rects = [tuple(rect) for rect in rectangles]
+
+    while len(rects) > 1:
+        uf = _connect(rects, max_distance)
+
+        groups = {}
+        for i, (x, y, w, h) in enumerate(rects):
+            root = uf.find(i)
+            if root in groups:
+                x_min, y_min, x_max, y_max = groups[root]
+                groups[root] = (min(x_min, x), min(y_min, y), max(x_max, x + w), max(y_max, y + h))
+            else:
+                groups[root] = (x, y, x + w, y + h)
+
+        if len(groups) == len(rects):
+            break
+
+        # 字典按插入顺序排列，即每组第一个矩形的顺序
+        rects = [(x_min, y_min, x_max - x_min, y_max - y_min) for x_min, y_min, x_max, y_max in groups.values()]
+
+    return rects
+
+
+def merge_overlapping_rectangles(rectangles: List[Rect]) -> List[Rect]:
+    """合并所有有重叠面积的矩形，等价于 overlap_threshold 为 0 时逐对合并直到不动点"""
+    return _cluster(rectangles, None)
+
+
+def merge_close_rectangles(rectangles: List[Rect], max_distance: float) -> List[Rect]:
+    """合并边缘距离不超过 max_distance 的矩形，等价于逐对合并直到不动点"""
+    return _cluster(rectangles, max_distance)
+
+
+def naive_merge_rectangles(rectangles: List[Rect], overlap_threshold: float = 0.0) -> List[Rect]:
+    """逐对合并重叠的矩形直到不再变化（O(n²) 每轮），用于 overlap_threshold 大于 0 的情况和性能对比"""
+    if not rectangles:
+        return []
+
+    # 创建一个副本以避免修改原始列表
+    rects = [rect for rect in rectangles]
+    changed = True
+
+    # 持续合并直到没有更多合并发生
+    while changed:
+        changed = False
+        new_rects = []
+        merged_indices = set()
+
+        for i in range(len(rects)):
+            if i in merged_indices:
+                continue
+
+            current = rects[i]
+            merged_rect = current
+
+            # 尝试与后面的所有矩形合并
+            for j in range(i + 1, len(rects)):
+                if j in merged_indices:
+                    continue
+
+                candidate = rects[j]
+                if should_merge(merged_rect, candidate, overlap_threshold):
+                    # 计算合并后的矩形边界
+                    x_min = min(merged_rect[0], candidate[0])
+                    y_min = min(merged_rect[1], candidate[1])
+                    x_max = max(merged_rect[0] + merged_rect[2], candidate[0] + candidate[2])
+                    y_max = max(merged_rect[1] + merged_rect[3], candidate[1] + candidate[3])
+                    merged_rect = (x_min, y_min, x_max - x_min, y_max - y_min)
+                    merged_indices.add(j)
+                    changed = True
+
+            new_rects.append(merged_rect)
+
+        rects = new_rects
+
+    return rects
+
+
+def naive_merge_close_rectangles(rectangles: List[Rect], max_distance: float) -> List[Rect]:
+    """逐对合并边缘距离相近的矩形直到不再变化（O(n²) 每轮），用于性能对比"""
+    changed = True
+    while changed and len(rectangles) > 1:
+        changed = False
+        new_rectangles = []
+        merged = [False] * len(rectangles)
+
+        for i in range(len(rectangles)):
+            if merged[i]:
+                continue
+
+            current_rect = rectangles[i]
+
+            for j in range(i + 1, len(rectangles)):
+                if merged[j]:
+                    continue
+
+                rect2 = rectangles[j]
+                if rect_distance(current_rect, rect2) <= max_distance:
+                    # 合并两个矩形
+                    x = min(current_rect[0], rect2[0])
+                    y = min(current_rect[1], rect2[1])
+                    w = max(current_rect[0] + current_rect[2], rect2[0] + rect2[2]) - x
+                    h = max(current_rect[1] + current_rect[3], rect2[1] + rect2[3]) - y
+                    current_rect = (x, y, w, h)
+                    merged[j] = True
+                    changed = True
+
+            new_rectangles.append(current_rect)
+            merged[i] = True
+
+        rectangles = new_rectangles
+
+    return rectangles
+
+
+def random_rectangles(count: int, width: int = 672, height: int = 480, max_size: int = 12, seed: int = 0):
+    """生成密集的随机矩形，模拟噪声较多的背景中大量细小轮廓"""
+    import random
+
+    rng = random.Random(seed)
+    return [
+        (rng.randrange(width), rng.randrange(height), rng.randint(1, max_size), rng.randint(1, max_size))
+        for _ in range(count)
+    ]
+
+
+if __name__ == "__main__":
+    import time
+
+    # 在合成的密集轮廓上对比逐对合并与扫描线 + 并查集合并
+    print(f"{'数量':>6} | {'模式':<8} | {'逐对合并(ms)':>12} | {'扫描线(ms)':>10} | 结果一致")
+    for count in (100, 300, 1000, 3000):
+        rects = random_rectangles(count)
+        for mode, naive, fast in (
+                ('overlap', naive_merge_rectangles, merge_overlapping_rectangles),
+                ('close-5', lambda r: naive_merge_close_rectangles(r, 5), lambda r: merge_close_rectangles(r, 5))
+        ):
+            start_time = time.perf_counter()
+            naive_result = naive(rects)
+            naive_time = (time.perf_counter() - start_time) * 1000
+
+            start_time = time.perf_counter()
+            fast_result = fast(rects)
+            fast_time = (time.perf_counter() - start_time) * 1000
+
+            print(f"{count:>6} | {mode:<8} | {naive_time:>12.2f} | {fast_time:>10.2f} | {naive_result == fast_result}")
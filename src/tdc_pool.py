@@ -0,0 +1,200 @@
+import queue
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict
+
+from py_mini_racer import MiniRacer, init_mini_racer
+
+from src.utils import get_base_path
+
+# V8 在第一次创建 MiniRacer 的线程中初始化，若该线程退出后再使用会导致进程崩溃，
+# 因此在导入时完成初始化，之后才能在后台线程中预热运行环境。
+# src.main 在模块顶部导入本模块，使初始化发生在导入 src.main 的线程（通常为主线程）中
+init_mini_racer(ignore_duplicate_init=True)
+
+# 默认的运行环境池设置，可在配置文件的 tdc_pool 字段中覆盖
+DEFAULT_TDC_POOL_OPTIONS = {
+    'size': 2,  # 保持空闲的运行环境数量
+    'max_uses': 20  # 每个运行环境最多使用的次数，超过后销毁并重新创建
+}
+
+# 记录 env.js 执行完成后的全局属性，作为每次使用后清理的基准
+SNAPSHOT_SCRIPT = '''
+globalThis.__tdc_baseline__ = null;
+globalThis.__tdc_baseline__ = {
+    global: new Set(Object.getOwnPropertyNames(globalThis)),
+    window: new Set(Object.getOwnPropertyNames(window))
+};
+'''
+
+# 删除 TDC 脚本新增的全局属性并清空存储，使下一次使用接近全新的环境
+RESET_SCRIPT = '''
+(function () {
+    var baseline = globalThis.__tdc_baseline__;
+    [[globalThis, baseline.global], [window, baseline.window]].forEach(function (item) {
+        Object.getOwnPropertyNames(item[0]).forEach(function (name) {
+            if (!item[1].has(name)) {
+                try {
+                    delete item[0][name];
+                } catch (e) {
+                }
+            }
+        });
+    });
+    try {
+        window.localStorage.clear();
+        window.sessionStorage.clear();
+    } catch (e) {
+    }
+})();
+'''
+
+
+@lru_cache(maxsize=1)
+def load_env_script() -> str:
+    """读取补充浏览器环境的 env.js，只读取一次"""
+    with open(Path(get_base_path()) / 'static' / 'env.js', 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class TDCRuntime:
+    """已执行 env.js 的 MiniRacer 运行环境"""
+
+    def __init__(self):
+        self.ctx = MiniRacer()
+        self.ctx.eval(load_env_script())
+        self.ctx.eval(SNAPSHOT_SCRIPT)
+        self.uses = 0
+
+    def get_collect_and_eks(self, tdc):
+        """执行 TDC 脚本，返回 (collect, eks)"""
+        self.uses += 1
+        ctx = self.ctx
+
+        ctx.eval(tdc)
+
+        ctx.eval('window.TDC && "function" == typeof window.TDC.setData && window.TDC.setData("qf_7Pf__H")')
+
+        tdc_data = ctx.eval(
+            '(window.TDC && "function" == typeof window.TDC.getData) ? window.TDC.getData(true) || "---" : "------"'
+        )
+
+        tdc_info = ctx.eval(
+            '(window.TDC && "function" == typeof window.TDC.getInfo) ? window.TDC.getInfo().info || "---" : "------"'
+        )
+        return tdc_data, tdc_info
+
+    def reset(self):
+        """清理本次使用留下的全局状态"""
+        self.ctx.eval(RESET_SCRIPT)
+
+    def close(self):
+        self.ctx.close()
+
+
+class TDCRuntimePool:
+    """
+    预先初始化的 TDC 运行环境池
+
+    池中的运行环境已执行 env.js，使用后清理全局状态放回池中，使用 max_uses 次后销毁并在后台补充新的运行环境，
+    避免每次完成验证码都重新创建 V8 实例并执行 env.js，同时限制长期复用带来的内存增长和状态残留
+    """
+
+    def __init__(self, size: int = 2, max_uses: int = 20, prewarm: bool = True):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self._idle = queue.LifoQueue(maxsize=self.size)
+
+        if prewarm:
+            for _ in range(self.size):
+                self._replenish()
+
+    def _replenish(self):
+        """在后台创建一个新的运行环境放入池中"""
+
+        def create():
+            runtime = TDCRuntime()
+            try:
+                self._idle.put_nowait(runtime)
+            except queue.Full:
+                runtime.close()
+
+        threading.Thread(target=create, daemon=True).start()
+
+    def acquire(self) -> TDCRuntime:
+        """取出一个运行环境，池为空时直接创建"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return TDCRuntime()
+
+    def release(self, runtime: TDCRuntime, broken: bool = False):
+        """归还运行环境，出错或达到使用次数上限时销毁并补充"""
+        if not broken and runtime.uses < self.max_uses:
+            try:
+                runtime.reset()
+                self._idle.put_nowait(runtime)
+                return
+            except Exception:
+                # 清理失败或池已满则视为不可复用，同样销毁并补充，池已满时补充的运行环境会被直接销毁
+                pass
+
+        runtime.close()
+        self._replenish()
+
+    def get_collect_and_eks(self, tdc):
+        runtime = self.acquire()
+        try:
+            result = runtime.get_collect_and_eks(tdc)
+        except Exception:
+            self.release(runtime, broken=True)
+            raise
+        self.release(runtime)
+        return result
+
+    def close(self):
+        """销毁池中所有空闲的运行环境"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def normalize_tdc_pool_options(options: Any) -> Dict[str, int]:
+    """合并默认设置，忽略无效的值"""
+    result = DEFAULT_TDC_POOL_OPTIONS.copy()
+    if not isinstance(options, dict):
+        return result
+
+    for key, default in DEFAULT_TDC_POOL_OPTIONS.items():
+        value = options.get(key, default)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            print(f"警告: 忽略无效的 tdc_pool 配置 '{key}': {value}")
+            continue
+        result[key] = value
+
+    return result
+
+
+def get_tdc_pool(options: Any = None) -> TDCRuntimePool:
+    """
+    获取全局 TDC 运行环境池，第一次调用时创建
+
+    参数:
+        options: 配置文件中的 tdc_pool 设置，与当前池的设置不同时销毁空闲的运行环境并重建
+    """
+    global _pool
+
+    options = normalize_tdc_pool_options(options)
+    with _pool_lock:
+        if _pool is None or (_pool.size, _pool.max_uses) != (options['size'], options['max_uses']):
+            if _pool is not None:
+                _pool.close()
+            _pool = TDCRuntimePool(options['size'], options['max_uses'])
+        return _pool
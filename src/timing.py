@@ -0,0 +1,74 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class Timings:
+    """
+    记录各阶段的耗时
+
+    每个阶段记录为一个时间段（名称、相对开始时间、持续时间，单位毫秒），可以在多个线程中同时记录
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str):
+        """记录 with 代码块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter())
+
+    def add(self, name: str, start: float, end: float):
+        """记录一个时间段，start 和 end 为 time.perf_counter() 的值"""
+        with self._lock:
+            self.spans.append((name, (start - self.start) * 1000, (end - start) * 1000))
+
+    def totals(self) -> Dict[str, float]:
+        """每个阶段的总耗时（毫秒）"""
+        result = {}
+        with self._lock:
+            for name, _, duration in self.spans:
+                result[name] = result.get(name, 0) + duration
+        return result
+
+    def to_list(self) -> List[Dict[str, float]]:
+        """按开始时间排列的所有时间段"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda item: item[1])
+        return [
+            {'name': name, 'start': round(start, 2), 'duration': round(duration, 2)}
+            for name, start, duration in spans
+        ]
+
+    def summary(self) -> Dict:
+        """返回给调用者的耗时信息：总耗时、每个阶段的总耗时和所有时间段（毫秒）"""
+        return {
+            'total': round((time.perf_counter() - self.start) * 1000, 2),
+            'stages': {name: round(duration, 2) for name, duration in self.totals().items()},
+            'spans': self.to_list()
+        }
+
+
+class NullTimings(Timings):
+    """不记录任何内容的 Timings，未开启计时时使用"""
+
+    enabled = False
+
+    @contextmanager
+    def span(self, name: str):
+        yield
+
+    def add(self, name: str, start: float, end: float):
+        pass
+
+
+NULL_TIMINGS = NullTimings()
@@ -1,4 +1,5 @@
 import json
+import os
 import sys
 from pathlib import Path
 
@@ -36,3 +37,24 @@ def json_parse(json_str, else_none=True):
 
 def json_stringify(var, **args):
     return json.dumps(var, ensure_ascii=False, **args)
+
+
+def load_saved_captchas(folder):
+    """
+    读取目录中保存的验证码，每个子目录包含 bg.jpg 和 sprite.jpg（detect_accuracy.py 保存失败案例的格式）
+
+    返回:
+        按子目录名称排序的 [(名称, 背景图片, 需选图片), ...]
+    """
+    captchas = []
+    for name in sorted(os.listdir(folder)):
+        bg_path = os.path.join(folder, name, "bg.jpg")
+        sprite_path = os.path.join(folder, name, "sprite.jpg")
+        if not (os.path.isfile(bg_path) and os.path.isfile(sprite_path)):
+            continue
+        with open(bg_path, "rb") as f:
+            bg_img = f.read()
+        with open(sprite_path, "rb") as f:
+            sprite_img = f.read()
+        captchas.append((name, bg_img, sprite_img))
+    return captchas
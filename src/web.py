@@ -1,30 +1,44 @@
+import asyncio
 import base64
 import binascii
+import functools
+import os
 import re
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Any, Optional
 from urllib.parse import urlparse
 import warnings
 
-import requests
 from fastapi import FastAPI, Request, Depends, HTTPException, UploadFile
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, RedirectResponse
+from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, RedirectResponse, Response
 import uvicorn
 
 config_path = 'config.json'
 
+# 验证码识别使用的进程数，大于 1 时使用进程池并行匹配
+icr_workers = None
+
 if __name__ == '__main__':
     # 将项目根目录添加到 sys.path
     project_root = Path(__file__).parent.parent
     sys.path.append(str(project_root))
     config_path = str(project_root / "config.json")
 
-from src.ICR import find_part_positions, main as icr_main
+from src.ICR import find_part_positions, find_part_solutions, main as icr_main, MATCH_METHODS
+from src.image_cache import image_cache
 from src.utils import get_base_path, json_parse
 from src.version import PROGRAM_VERSION
 
-from src.main import MainLogic
+from src.http_client import get_http_client
+from src.main import MainLogic, load_captcha_dependencies
+from src.metrics import CONTENT_TYPE, WEB_IN_PROGRESS, WEB_REQUEST_SECONDS, registry, render_value
+from src.timing import NULL_TIMINGS, Timings
+
+# 网页模式需要自动完成验证码，启动时提前导入识别依赖
+load_captcha_dependencies()
 
 app = FastAPI(
     title="RainyunCheckIn API",
@@ -50,6 +64,45 @@ async def redirect_to_external_docs():
 warnings.filterwarnings("ignore", message="Duplicate Operation ID")
 
 
+# 同步的网络请求（签到、获取验证码等）和验证码识别分别放到有界线程池中执行，避免阻塞事件循环
+IO_WORKERS = 32
+CPU_WORKERS = os.cpu_count() or 1
+
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='web-io')
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix='web-cpu')
+
+
+async def run_io(func, *args, **kwargs):
+    """在网络请求线程池中执行同步函数"""
+    return await asyncio.get_running_loop().run_in_executor(io_executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_cpu(func, *args, **kwargs):
+    """在验证码识别线程池中执行同步函数"""
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, functools.partial(func, *args, **kwargs))
+
+
+def route_label(request: Request) -> str:
+    """指标中使用的路径，未定义的路径统一记为 other，避免任意路径产生大量标签"""
+    path = request.url.path
+    return path if any(getattr(route, 'path', None) == path for route in app.routes) else 'other'
+
+
+# 记录每个接口的处理耗时和进行中的请求数
+@app.middleware('http')
+async def metrics_middleware(request: Request, call_next):
+    path = route_label(request)
+    status = 500
+    start = time.perf_counter()
+    try:
+        with WEB_IN_PROGRESS.track_in_progress(path=path):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        WEB_REQUEST_SECONDS.observe(time.perf_counter() - start, path=path, status=status)
+
+
 def make_err(err_msg):
     return {"error": err_msg}
 
@@ -153,13 +206,17 @@ async def parse_main_logic(request: Request) -> MainLogic:
     """
     解析由 API 传入的 Config 配置，默认使用服务器配置文件中的配置
     """
-    return MainLogic(config_path, await parse_api_config(request))
+    # 读取配置文件可能涉及磁盘读写，不在事件循环中执行；识别、TDC、PoW 等计算阶段在验证码识别线程池中执行
+    return await run_io(MainLogic, config_path, await parse_api_config(request), cpu_executor=cpu_executor)
 
 
 # 解析无需认证的主逻辑类
 async def parse_na_main(request: Request):
     params = await parse_params(request)
-    main = MainLogic(config_path, await parse_api_config(request, params=params, no_need_auth=True), no_need_auth=True)
+    main = await run_io(
+        MainLogic, config_path, await parse_api_config(request, params=params, no_need_auth=True), no_need_auth=True,
+        cpu_executor=cpu_executor
+    )
     aid = params.get('aid', None)
     if aid is not None:
         aid = str(aid)
@@ -177,7 +234,7 @@ async def handle_check_in(params=Depends(parse_params), main=Depends(parse_main_
     """
     签到接口
     """
-    return main.check_in(params.get('captcha'))
+    return await run_io(main.check_in, params.get('captcha'))
 
 
 def bool_value(value):
@@ -190,9 +247,16 @@ async def handle_auto_check_in(params=Depends(parse_params), main=Depends(parse_
     """
     自动签到接口
     """
-    return main.auto_check_in(
+    match_method = params.get('method', 'template')
+    if match_method not in MATCH_METHODS:
+        return {'error': f"参数错误：method 必须为以下值：{', '.join(MATCH_METHODS)}"}
+
+    return await run_io(
+        main.auto_check_in,
         force=bool_value(params.get("force", "")),
-        match_method=params.get('method', 'template')
+        match_method=match_method,
+        workers=icr_workers,
+        collect_timings=bool_value(params.get('timings', False))
     )
 
 
@@ -202,7 +266,7 @@ async def get_check_in_status(main=Depends(parse_main_logic)):
     """
     检测签到状态
     """
-    return main.get_check_in_status()
+    return await run_io(main.get_check_in_status)
 
 
 # 获取验证码数据
@@ -211,7 +275,7 @@ async def handle_get_captcha_data(main=Depends(parse_na_main)):
     """
     获取验证码数据
     """
-    return main.get_captcha_data()
+    return await run_io(main.get_captcha_data)
 
 
 def get_b64_img(bytes_data, data_url=True):
@@ -235,7 +299,7 @@ async def handle_get_captcha_images(params=Depends(parse_params), main=Depends(p
     if return_type not in ['data_url', 'base64', 'url', 'data_uri']:
         return {'error': "参数错误：return_type 必须为以下值之一：data_url, base64, url"}
 
-    bg_url, sprite_url = main.get_captcha_urls(data or main.get_captcha_data())
+    bg_url, sprite_url = main.get_captcha_urls(data or await run_io(main.get_captcha_data))
 
     if return_type == 'url':
         return {
@@ -243,7 +307,7 @@ async def handle_get_captcha_images(params=Depends(parse_params), main=Depends(p
             'sprite': sprite_url
         }
 
-    bg_img, sprite_img = main.get_captcha_images(bg_url=bg_url, sprite_url=sprite_url)
+    bg_img, sprite_img = await run_io(main.get_captcha_images, bg_url=bg_url, sprite_url=sprite_url)
     return {
         'bg': get_b64_img(bg_img, return_type != 'base64'),
         'sprite': get_b64_img(sprite_img, return_type != 'base64')
@@ -272,23 +336,23 @@ async def parse_image_data(image_data: Any) -> bytes:
             except Exception:
                 raise HTTPException(status_code=200, detail=make_err("无效的base64数据"))
 
-        # 检查是否是普通base64字符串
-        try:
-            # 尝试解码base64
-            return base64.b64decode(image_data)
-        except (binascii.Error, ValueError):
-            pass
-
-        # 检查是否是http/https URL
+        # 检查是否是http/https URL（需在base64之前检查，否则URL会被宽松的base64解码误解析）
         parsed = urlparse(image_data)
         if parsed.scheme in ('http', 'https'):
             try:
-                response = requests.get(image_data)
+                response = await run_io(get_http_client().get, image_data)
                 response.raise_for_status()
                 return response.content
             except Exception as e:
                 raise HTTPException(status_code=200, detail=make_err(f"无法从URL获取图片: {str(e)}"))
 
+        # 检查是否是普通base64字符串
+        try:
+            # 尝试解码base64
+            return base64.b64decode(image_data)
+        except (binascii.Error, ValueError):
+            pass
+
     # 如果以上都不是，尝试直接作为bytes返回
     if isinstance(image_data, bytes):
         return image_data
@@ -296,6 +360,23 @@ async def parse_image_data(image_data: Any) -> bytes:
     raise HTTPException(status_code=200, detail=make_err("不支持的图片格式"))
 
 
+# /find_captcha_positions 最多返回的方案数量
+MAX_TOP_K = 20
+
+
+def format_match(match):
+    """详细模式下返回的单个匹配信息"""
+    x, y, w, h = match['bg_rect']
+    return {
+        'sprite_idx': match['sprite_idx'],
+        'angle': match['angle'],
+        'similarity': float(match['similarity']),
+        'sprite_rect': match['sprite_rect'],
+        'bg_rect': match['bg_rect'],
+        'position': (x + w / 2, y + h / 2)
+    }
+
+
 @app.api_route('/find_captcha_positions', methods=['GET', 'POST'])
 async def handle_find_captcha_positions(params=Depends(parse_params), main=Depends(parse_na_main)):
     """
@@ -306,43 +387,61 @@ async def handle_find_captcha_positions(params=Depends(parse_params), main=Depen
     data = params.get('data', None)
     match_method = params.get('method', 'template')
     detailed = bool_value(params.get('detailed', False))
+    top_k = params.get('top_k', None)
+    timings = Timings() if bool_value(params.get('timings', False)) else NULL_TIMINGS
 
     if isinstance(data, str):
         data = json_parse(data)
     if isinstance(data, dict):
         # noinspection PyBroadException
         try:
-            bg, sprite = main.get_captcha_images(data)
+            bg, sprite = await run_io(main.get_captcha_images, data, timings=timings)
         except:
             pass
 
     if not bg or not sprite:
         if data is None:
-            bg, sprite = main.get_captcha_images(main.get_captcha_data())
+            with timings.span('prehandle'):
+                data = await run_io(main.get_captcha_data)
+            bg, sprite = await run_io(main.get_captcha_images, data, timings=timings)
         else:
             return {'error': "无法通过验证码数据解析 bg 和 sprite"} if data else {
                 'error': "参数错误：bg 或 sprite 不能为空"}
 
-    if match_method not in ['template', 'brute', 'speed']:
-        return {'error': "参数错误：method 必须为以下值：template, brute, speed"}
-
-    bg = await parse_image_data(bg)
-    sprite = await parse_image_data(sprite)
-    if detailed:
-        data = []
-        matches = icr_main(bg, sprite, match_method)
-        for match in matches:
-            x, y, w, h = match['bg_rect']
-            data.append({
-                'sprite_idx': match['sprite_idx'],
-                'angle': match['angle'],
-                'sprite_rect': match['sprite_rect'],
-                'bg_rect': match['bg_rect'],
-                'position': (x + w / 2, y + h / 2)
-            })
-        return {"data": data}
+    if match_method not in MATCH_METHODS:
+        return {'error': f"参数错误：method 必须为以下值：{', '.join(MATCH_METHODS)}"}
+
+    if top_k is not None:
+        try:
+            top_k = int(top_k)
+        except (TypeError, ValueError):
+            top_k = 0
+        if not 1 <= top_k <= MAX_TOP_K:
+            return {'error': f"参数错误：top_k 必须为 1 到 {MAX_TOP_K} 之间的整数"}
+
+    with timings.span('load_images'):
+        bg = await parse_image_data(bg)
+        sprite = await parse_image_data(sprite)
+
+    if top_k is not None:
+        # 按总相似度从高到低返回多个全局一致的方案
+        solutions = await run_cpu(find_part_solutions, bg, sprite, match_method, icr_workers, top_k, timings)
+        items = []
+        for solution in solutions:
+            item = {'score': float(solution['score']), 'positions': solution['positions']}
+            if detailed:
+                item['data'] = [format_match(match) for match in solution['matches']]
+            items.append(item)
+        result = {"solutions": items}
+    elif detailed:
+        matches = await run_cpu(icr_main, bg, sprite, match_method, workers=icr_workers, timings=timings)
+        result = {"data": [format_match(match) for match in matches]}
     else:
-        return {"positions": find_part_positions(bg, sprite, match_method)}
+        result = {"positions": await run_cpu(find_part_positions, bg, sprite, match_method, icr_workers, timings)}
+
+    if timings.enabled:
+        result['timings'] = timings.summary()
+    return result
 
 
 @app.api_route('/complete_captcha', methods=['GET', 'POST'])
@@ -353,15 +452,21 @@ async def handle_complete_captcha(params=Depends(parse_params), main=Depends(par
     match_method = params.get('method', 'template')
     data = params.get('data', None)
 
-    if match_method not in ['template', 'brute', 'speed']:
-        return {'error': "参数错误：method 必须为以下值：template, brute, speed"}
+    if match_method not in MATCH_METHODS:
+        return {'error': f"参数错误：method 必须为以下值：{', '.join(MATCH_METHODS)}"}
 
     if isinstance(data, str):
         data = json_parse(data)
     if data is not None and not isinstance(data, dict):
         return {'error': "参数错误：data 必须为对象"}
 
-    return main.complete_captcha(data, match_method=match_method)
+    timings = Timings() if bool_value(params.get('timings', False)) else NULL_TIMINGS
+    result = await run_io(
+        main.complete_captcha, data, match_method=match_method, workers=icr_workers, timings=timings
+    )
+    if timings.enabled and isinstance(result, dict):
+        result = dict(result, timings=timings.summary())
+    return result
 
 
 @app.api_route('/build_verify_form_data', methods=['GET', 'POST'])
@@ -373,11 +478,11 @@ async def handle_build_verify_form_data(params=Depends(parse_params), main=Depen
     positions = params.get('positions', None)
     match_method = params.get('method', 'template')
 
-    if positions is None and match_method not in ['template', 'brute', 'speed']:
-        return {'error': "参数错误：method 必须为以下值：template, brute, speed"}
+    if positions is None and match_method not in MATCH_METHODS:
+        return {'error': f"参数错误：method 必须为以下值：{', '.join(MATCH_METHODS)}"}
 
     if data is None:
-        data = main.get_captcha_data()
+        data = await run_io(main.get_captcha_data)
 
     if isinstance(data, str):
         data = json_parse(data)
@@ -390,10 +495,41 @@ async def handle_build_verify_form_data(params=Depends(parse_params), main=Depen
         return {'error': "参数错误：positions 必须为数组"}
 
     if not positions:
-        bg_img, sprite_img = main.get_captcha_images(data)
-        positions = find_part_positions(bg_img, sprite_img, match_method)
+        bg_img, sprite_img = await run_io(main.get_captcha_images, data)
+        positions = await run_cpu(find_part_positions, bg_img, sprite_img, match_method, icr_workers)
+
+    return await run_io(main.build_verify_form, data, positions)
+
+
+@app.get('/image_cache_stats')
+async def handle_image_cache_stats():
+    """
+    验证码识别缓存的命中、未命中、淘汰次数及占用
+    """
+    return image_cache.stats()
+
 
-    return main.build_verify_form(data, positions)
+def image_cache_metrics():
+    stats = image_cache.stats()
+    return [
+        *render_value('rainyun_image_cache_hits_total', '验证码识别缓存命中次数', stats['hits'], 'counter'),
+        *render_value('rainyun_image_cache_misses_total', '验证码识别缓存未命中次数', stats['misses'], 'counter'),
+        *render_value('rainyun_image_cache_evictions_total', '验证码识别缓存淘汰次数', stats['evictions'], 'counter'),
+        *render_value('rainyun_image_cache_entries', '验证码识别缓存的项数', stats['entries']),
+        *render_value('rainyun_image_cache_bytes', '验证码识别缓存占用的字节数', stats['bytes']),
+        *render_value('rainyun_image_cache_max_bytes', '验证码识别缓存的上限（字节）', stats['max_bytes'])
+    ]
+
+
+registry.add_collector(image_cache_metrics)
+
+
+@app.get('/metrics')
+async def handle_metrics():
+    """
+    Prometheus 格式的运行指标：识别、PoW、TDC 耗时，上游请求耗时和重试，验证码校验结果，接口耗时和进行中的请求数
+    """
+    return Response(registry.render(), media_type=CONTENT_TYPE)
 
 
 # CORS中间件
@@ -0,0 +1,107 @@
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from load_test import StubState, start_stub_server, write_config
+
+# 测试的命令：(app.py 参数, 标准输入)
+COMMANDS = {
+    'help': (['-h'], None),
+    'status': (['status'], None),
+    'check_in': (['check_in'], base64.b64encode(b'{"ticket": "load-test", "randstr": "@load"}').decode() + '\n')
+}
+# 只在识别验证码、执行 TDC 脚本时需要的依赖
+HEAVY_MODULES = ('cv2', 'numpy', 'py_mini_racer')
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+def run_command(args, stdin, config_path, import_time=False):
+    """
+    运行一次 app.py
+
+    返回:
+        (耗时毫秒, 标准错误输出)
+    """
+    command = [sys.executable] + (['-X', 'importtime'] if import_time else []) + [APP_PATH] + args
+    if args[0] != '-h':
+        command += ['-c', config_path]
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        command, input=stdin, capture_output=True, text=True, encoding='utf-8',
+        env=dict(os.environ, PYTHONIOENCODING='utf-8')
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} 执行失败: {result.stdout[-500:]}{result.stderr[-500:]}")
+    return elapsed, result.stderr
+
+
+def parse_import_time(output):
+    """
+    解析 -X importtime 的输出
+
+    返回:
+        (导入总耗时毫秒, 已加载的重型依赖)
+    """
+    total = 0
+    loaded = set()
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 顶层导入没有额外缩进，其耗时包含了嵌套导入
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+        if name.strip() in HEAVY_MODULES:
+            loaded.add(name.strip())
+    return total / 1000, sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='app.py 启动耗时测试（使用本地模拟接口）')
+    parser.add_argument('--commands', type=str, nargs='+', default=list(COMMANDS), choices=list(COMMANDS),
+                        help=f"测试的命令，默认为 {' '.join(COMMANDS)}")
+    parser.add_argument('--repeat', type=int, default=5, help='每个命令运行的次数，默认为 5')
+    parser.add_argument('--output', type=str, default=None, help='保存结果的 JSON 文件')
+    args = parser.parse_args()
+
+    server, stub_url = start_stub_server(StubState(latency=0, captchas=1))
+    config_path = write_config(stub_url, 1)
+
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'commands': {}
+    }
+    print(f"\n{'命令':<12}{'中位耗时(ms)':>14}{'最短耗时(ms)':>14}{'导入耗时(ms)':>14}  已加载的重型依赖")
+    for name in args.commands:
+        command_args, stdin = COMMANDS[name]
+        durations = sorted(run_command(command_args, stdin, config_path)[0] for _ in range(max(1, args.repeat)))
+        import_time, loaded = parse_import_time(run_command(command_args, stdin, config_path, True)[1])
+
+        result = results['commands'][name] = {
+            'median': round(durations[len(durations) // 2], 1),
+            'min': round(durations[0], 1),
+            'import_time': round(import_time, 1),
+            'heavy_modules': loaded
+        }
+        print(f"{name:<12}{result['median']:>14.1f}{result['min']:>14.1f}{result['import_time']:>14.1f}  "
+              f"{', '.join(loaded) or '无'}")
+
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()